@@ -0,0 +1,100 @@
+import io
+import json
+import os
+
+import pytest
+
+import wb_bundle
+import wb_func
+
+
+@pytest.fixture
+def wb_directory(tmp_path):
+    os.makedirs(tmp_path/'wb_files'/'test_page')
+    with open(tmp_path/'wb_files'/'test_page'/'a.csv', 'w') as wortverbund_file:
+        wortverbund_file.write('x;3/4\ny;1/2\nz;1/5\n')
+    with open(tmp_path/'wb_files'/'test_page'/'b.csv', 'w') as wortverbund_file:
+        wortverbund_file.write('')
+    return str(tmp_path/'wb_files')
+
+
+def crafted_bundle(project, wortverbund_names):
+    # A bundle as an attacker could write it, with arbitrary names.
+    output = io.BytesIO()
+    writer = wb_bundle._BundleWriter(output, 'gzip')
+    writer.add('metadata.json', [json.dumps({'project': project, 'kind': 'page',
+                                             'wortverbund': {name: 4 for name in wortverbund_names},
+                                             'x_values': False}).encode('utf-8')])
+    for name in wortverbund_names:
+        writer.add('wortverbund/'+name+'.csv', [b'x;1\n'])
+    writer.close()
+    output.seek(0)
+    return output
+
+
+def test_round_trip(wb_directory, tmp_path):
+    bundle_path = str(tmp_path/'test.wbb')
+    wb_bundle.export_bundle('test_page', bundle_path, wb_directory, 'gzip', x_values=True)
+    assert wb_bundle.import_bundle(bundle_path, wb_directory, 'copy_page') == 'copy_page'
+    for wortverbund in ('a', 'b'):
+        with open(wb_directory+'/test_page/'+wortverbund+'.csv', 'rb') as original_file:
+            with open(wb_directory+'/copy_page/'+wortverbund+'.csv', 'rb') as copied_file:
+                assert original_file.read() == copied_file.read()
+    with wb_bundle.BundleReader(bundle_path) as reader:
+        assert reader.project == 'test_page'
+        assert reader.wortverbund_names() == ['a', 'b']
+        content_list, _, _, x_values = wb_func.prepare_wortverbund(
+            wb_func.read_wortverbund(wb_directory+'/test_page/a.csv'))
+        assert reader.read_x_values('a') == (content_list, x_values)
+    with pytest.raises(FileExistsError):
+        wb_bundle.import_bundle(bundle_path, wb_directory)
+
+
+def test_damaged_member_raises_bundle_error(wb_directory):
+    output = io.BytesIO()
+    index = wb_bundle.export_bundle('test_page', output, wb_directory, 'gzip')
+    data = bytearray(output.getvalue())
+    entry = index['wortverbund/a.csv']
+    data[entry['offset']+entry['length']//2] ^= 0xff
+    with wb_bundle.BundleReader(io.BytesIO(bytes(data))) as reader:
+        with pytest.raises(wb_bundle.BundleError):
+            reader.read('wortverbund/a.csv')
+
+
+def test_truncated_bundle_raises_bundle_error(wb_directory):
+    output = io.BytesIO()
+    wb_bundle.export_bundle('test_page', output, wb_directory, 'gzip')
+    with pytest.raises(wb_bundle.BundleError):
+        wb_bundle.BundleReader(io.BytesIO(output.getvalue()[:-5]))
+
+
+def test_decompression_is_bounded(tmp_path):
+    output = io.BytesIO()
+    writer = wb_bundle._BundleWriter(output, 'gzip')
+    writer.add('metadata.json', [b'{}'])
+    writer.add('zeros', [bytes(wb_bundle.CHUNK_SIZE)]*8)
+    writer.close()
+    with wb_bundle.BundleReader(output) as reader:
+        chunks = list(reader.chunks('zeros'))
+    assert max(len(chunk) for chunk in chunks) <= wb_bundle.CHUNK_SIZE
+    assert sum(len(chunk) for chunk in chunks) == 8*wb_bundle.CHUNK_SIZE
+
+
+@pytest.mark.parametrize('project, wortverbund_name', [
+    ('test_page', '../../../pwned'),
+    ('test_page', '..'),
+    ('test_page', '.journal'),
+    ('../../pwned', 'a'),
+    ('..', 'a'),
+    ('.journal', 'a'),
+])
+def test_malicious_names_are_rejected(wb_directory, tmp_path, project, wortverbund_name):
+    bundle = crafted_bundle(project, [wortverbund_name])
+    with pytest.raises(wb_bundle.BundleError):
+        wb_bundle.import_bundle(bundle, wb_directory, 'copy_page' if project == 'test_page' else None)
+    assert not os.path.exists(wb_directory+'/copy_page')
+    assert not os.path.exists(str(tmp_path/'pwned.csv'))
+    assert not os.path.exists(str(tmp_path/'pwned'))
+    assert sorted(os.listdir(wb_directory)) in (['test_page'], ['.tmp', 'test_page'])
+    if os.path.exists(wb_directory+'/.tmp'):
+        assert os.listdir(wb_directory+'/.tmp') == []
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+
+import wb_journal
+import wb_lock
+
+
+@pytest.fixture
+def wb_directory(tmp_path):
+    os.makedirs(tmp_path/'wb_files'/'test_page')
+    return str(tmp_path/'wb_files')
+
+
+def record_times(wb_directory, wortverbund):
+    return [moment for _, moment, _ in wb_journal.history('test_page', wortverbund, wb_directory)]
+
+
+def test_reconstruct_at_earlier_times(wb_directory):
+    wb_lock.append('test_page', 'a', 'x;1\ny;2\n', wb_directory)
+    wb_lock.append('test_page', 'a', 'z;3\n', wb_directory)
+    wb_lock.rewrite('test_page', 'a', 'x;1\nz;3\n', wb_directory=wb_directory)
+    times = record_times(wb_directory, 'a')
+    assert wb_journal.reconstruct('test_page', 'a', times[1], wb_directory) == ['x;1', 'y;2']
+    assert wb_journal.reconstruct('test_page', 'a', times[2], wb_directory) == ['x;1', 'y;2', 'z;3']
+    assert wb_journal.reconstruct('test_page', 'a', wb_directory=wb_directory) == ['x;1', 'z;3']
+    assert wb_journal.diff('test_page', 'a', times[2], wb_directory=wb_directory) == ([], ['y;2'])
+
+
+def test_reconstruct_before_the_journal_started(wb_directory):
+    assert wb_journal.reconstruct('test_page', 'a', wb_directory=wb_directory) is None
+    wb_lock.append('test_page', 'a', 'x;1\n', wb_directory)
+    assert wb_journal.reconstruct('test_page', 'a', 0, wb_directory) is None
+
+
+def test_reconstruct_a_removed_wortverbund(wb_directory):
+    wb_lock.append('test_page', 'a', 'x;1\n', wb_directory)
+    wb_lock.remove_wortverbund('test_page', 'a', wb_directory)
+    times = record_times(wb_directory, 'a')
+    assert wb_journal.reconstruct('test_page', 'a', times[0], wb_directory) == ['x;1']
+    assert wb_journal.reconstruct('test_page', 'a', wb_directory=wb_directory) == []
+
+
+def test_reconstruct_across_checkpoints(wb_directory, monkeypatch):
+    monkeypatch.setattr(wb_journal, 'CHECKPOINT_INTERVAL', 5)
+    expected = []
+    for i in range(23):
+        wb_lock.append('test_page', 'a', 'f'+str(i)+';'+str(i)+'\n', wb_directory)
+        expected.append('f'+str(i)+';'+str(i))
+        if i % 4 == 3:
+            wb_lock.rewrite('test_page', 'a', ''.join(line+'\n' for line in expected[1:]),
+                            wb_directory=wb_directory)
+            expected = expected[1:]
+    directory = wb_journal.journal_directory('test_page', 'a', wb_directory)
+    assert len(wb_journal._read_checkpoints(directory)) > 1
+    assert wb_journal.reconstruct('test_page', 'a', wb_directory=wb_directory) == expected
+    with open(wb_directory+'/test_page/a.csv') as wortverbund_file:
+        assert wortverbund_file.read().splitlines() == expected
+
+
+def test_operation_count_falls_back_to_the_log(wb_directory):
+    wb_lock.append('test_page', 'a', 'x;1\ny;2\n', wb_directory)
+    directory = wb_journal.journal_directory('test_page', 'a', wb_directory)
+    with open(directory+'/count.json') as count_file:
+        assert json.load(count_file)['operations'] == 2
+    os.remove(directory+'/count.json')
+    wb_lock.append('test_page', 'a', 'z;3\n', wb_directory)
+    with open(directory+'/count.json') as count_file:
+        assert json.load(count_file)['operations'] == 3
@@ -0,0 +1,76 @@
+import os
+import threading
+
+import pytest
+
+import wb_lock
+
+
+@pytest.fixture
+def wb_directory(tmp_path):
+    os.makedirs(tmp_path/'wb_files'/'test_page')
+    return str(tmp_path/'wb_files')
+
+
+def read(wb_directory, wortverbund):
+    with open(wb_directory+'/test_page/'+wortverbund+'.csv') as wortverbund_file:
+        return wortverbund_file.read()
+
+
+def test_append_returns_versions(wb_directory):
+    old_version, new_version = wb_lock.append('test_page', 'a', 'x;1\n', wb_directory)
+    assert old_version is None
+    assert new_version == wb_lock.version(wb_directory+'/test_page/a.csv')
+    wb_lock.append('test_page', 'a', 'y;2\n', wb_directory)
+    assert read(wb_directory, 'a') == 'x;1\ny;2\n'
+
+
+def test_concurrent_appends_are_not_lost(wb_directory):
+    def add(number):
+        for i in range(50):
+            wb_lock.append('test_page', 'a', str(number)+'_'+str(i)+';'+str(i)+'\n', wb_directory)
+
+    threads = [threading.Thread(target=add, args=(number,)) for number in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(read(wb_directory, 'a').splitlines()) == 200
+
+
+def test_rewrite_replaces_the_file(wb_directory):
+    wb_lock.append('test_page', 'a', 'x;1\ny;2\n', wb_directory)
+    new_version = wb_lock.rewrite('test_page', 'a', 'y;2\n', None, wb_directory)
+    assert read(wb_directory, 'a') == 'y;2\n'
+    assert new_version == wb_lock.version(wb_directory+'/test_page/a.csv')
+    # Nothing is left behind in the temporary directory.
+    assert os.listdir(wb_directory+'/.tmp') == []
+
+
+def test_rewrite_creates_a_missing_wortverbund(wb_directory):
+    wb_lock.rewrite('test_page', 'new', 'x;1\n', None, wb_directory)
+    assert read(wb_directory, 'new') == 'x;1\n'
+
+
+def test_rewrite_with_stale_version_raises_conflict(wb_directory):
+    wb_lock.append('test_page', 'a', 'x;1\n', wb_directory)
+    expected_version = wb_lock.version(wb_directory+'/test_page/a.csv')
+    wb_lock.append('test_page', 'a', 'y;2\n', wb_directory) # someone else
+    with pytest.raises(wb_lock.ConflictError):
+        wb_lock.rewrite('test_page', 'a', 'x;1\n', expected_version, wb_directory)
+    assert read(wb_directory, 'a') == 'x;1\ny;2\n'
+
+
+def test_rewrite_with_current_version(wb_directory):
+    wb_lock.append('test_page', 'a', 'x;1\n', wb_directory)
+    expected_version = wb_lock.version(wb_directory+'/test_page/a.csv')
+    wb_lock.rewrite('test_page', 'a', 'z;3\n', expected_version, wb_directory)
+    assert read(wb_directory, 'a') == 'z;3\n'
+
+
+def test_remove(wb_directory):
+    wb_lock.append('test_page', 'a', 'x;1\n', wb_directory)
+    wb_lock.remove_wortverbund('test_page', 'a', wb_directory)
+    assert not os.path.exists(wb_directory+'/test_page/a.csv')
+    wb_lock.remove_project('test_page', wb_directory)
+    assert not os.path.exists(wb_directory+'/test_page')
@@ -0,0 +1,69 @@
+import os
+import urllib.error
+
+import pytest
+
+import wb_server
+
+
+@pytest.fixture(scope='module')
+def base_url(tmp_path_factory):
+    wb_directory = tmp_path_factory.mktemp('wb_files')
+    os.makedirs(wb_directory/'test_page')
+    with open(wb_directory/'test_page'/'Frau Dörr.csv', 'w') as wortverbund_file:
+        wortverbund_file.write('Witwe;6/15\nGärtnerin;12/3\nalt;40/1\n')
+    with open(wb_directory/'test_page'/'plot.csv', 'w') as wortverbund_file:
+        wortverbund_file.write('named like a route;2/1\n')
+    with wb_server.serve_in_background(str(wb_directory)) as base_url:
+        yield base_url
+
+
+def status(base_url, path, **query):
+    try:
+        wb_server.fetch(base_url, path, **query)
+    except urllib.error.HTTPError as error:
+        return error.code
+    return 200
+
+
+def test_projects(base_url):
+    assert wb_server.fetch(base_url, '/projects') == {'projects': ['test_page']}
+
+
+def test_project(base_url):
+    body = wb_server.fetch(base_url, '/projects/test_page')
+    assert sorted((entry['name'], entry['features']) for entry in body['wortverbund']) == [
+        ('Frau Dörr', 3), ('plot', 1)]
+
+
+def test_features_in_range(base_url):
+    body = wb_server.fetch(base_url, '/projects/test_page/wortverbund/Frau Dörr',
+                           start='10/1', end='41/1')
+    assert [feature['feature'] for feature in body['features']] == ['Gärtnerin', 'alt']
+    body = wb_server.fetch(base_url, '/projects/test_page/wortverbund/Frau Dörr',
+                           limit='1')
+    assert [feature['feature'] for feature in body['features']] == ['Witwe']
+
+
+def test_wortverbund_named_like_a_route(base_url):
+    body = wb_server.fetch(base_url, '/projects/test_page/wortverbund/plot')
+    assert body['features'][0]['feature'] == 'named like a route'
+
+
+def test_curves(base_url):
+    body = wb_server.fetch(base_url, '/projects/test_page/curves',
+                           wortverbund='Frau Dörr')
+    assert [number for _, number in body['curves']['Frau Dörr']] == [1, 2, 3]
+    assert len(body['total']) == 3
+
+
+def test_bad_request(base_url):
+    assert status(base_url, '/projects/test_page/wortverbund/Frau Dörr', limit='many') == 400
+
+
+def test_not_found(base_url):
+    assert status(base_url, '/projects/missing_page') == 404
+    assert status(base_url, '/projects/test_page/wortverbund/missing') == 404
+    assert status(base_url, '/projects/test_page/missing') == 404
+    assert status(base_url, '/projects/test_page/curves', wortverbund='missing') == 404
+    assert status(base_url, '/elsewhere') == 404
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+import wb_lock
+import wb_sync
+
+
+@pytest.fixture
+def directories(tmp_path):
+    os.makedirs(tmp_path/'wb_files'/'test_page')
+    return str(tmp_path/'wb_files'), str(tmp_path/'sc_files')
+
+
+def sync(directories):
+    wb_directory, sc_directory = directories
+    return wb_sync.sync('test_page', 'a', wb_directory, sc_directory)
+
+
+def read_sc(directories):
+    with open(directories[1]+'/a.txt') as sign_compare_file:
+        return sign_compare_file.read()
+
+
+def test_sync_after_append(directories):
+    wb_lock.append('test_page', 'a', 'x;1\ny;2\n', directories[0])
+    assert sync(directories) == (wb_sync.REWRITTEN, 2)
+    assert sync(directories) == (wb_sync.UNCHANGED, 0)
+    wb_lock.append('test_page', 'a', 'z;3\n', directories[0])
+    assert sync(directories) == (wb_sync.APPENDED, 1)
+    assert read_sc(directories) == 'x;y;z;'
+
+
+def test_incomplete_lines_wait_for_the_next_sync(directories):
+    wb_lock.append('test_page', 'a', 'x;1\ny;', directories[0])
+    assert sync(directories) == (wb_sync.REWRITTEN, 1)
+    wb_lock.append('test_page', 'a', '2\n', directories[0])
+    assert sync(directories) == (wb_sync.APPENDED, 1)
+    assert read_sc(directories) == 'x;y;'
+
+
+def test_sync_after_rewrite(directories):
+    wb_lock.append('test_page', 'a', 'x;1\ny;2\nz;3\n', directories[0])
+    sync(directories)
+    wb_lock.rewrite('test_page', 'a', 'x;1\nz;3\n', wb_directory=directories[0])
+    assert sync(directories) == (wb_sync.REWRITTEN, 2)
+    assert read_sc(directories) == 'x;z;'
+
+
+def test_rewrite_is_detected_when_the_inode_is_reused(directories):
+    # Removing and adding features quickly may hand the inode of the replaced
+    # file to the new one and restore its size.
+    expected = []
+    for i in range(20):
+        wb_lock.append('test_page', 'a', 'f'+str(i)+';'+str(i)+'\n', directories[0])
+        expected.append('f'+str(i))
+        sync(directories)
+        # Two rewrites, as the second one may get the inode back.
+        for _ in range(2):
+            wb_lock.rewrite('test_page', 'a', ''.join(feature+';'+str(i)+'\n' for feature in expected[1:]),
+                            wb_directory=directories[0])
+        wb_lock.append('test_page', 'a', 'g'+str(i)+';'+str(i)+'\n', directories[0])
+        expected = expected[1:]+['g'+str(i)]
+        sync(directories)
+        assert read_sc(directories) == ''.join(feature+';' for feature in expected)
+
+
+def test_changed_sign_compare_file_is_rewritten(directories):
+    wb_lock.append('test_page', 'a', 'x;1\n', directories[0])
+    sync(directories)
+    with open(directories[1]+'/a.txt', 'a') as sign_compare_file:
+        sign_compare_file.write('other;')
+    wb_lock.append('test_page', 'a', 'y;2\n', directories[0])
+    assert sync(directories) == (wb_sync.REWRITTEN, 2)
+    assert read_sc(directories) == 'x;y;'
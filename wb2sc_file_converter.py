@@ -23,6 +23,8 @@ import csv
 import os
 import tkinter as tk
 
+import wb_sync # imports the incremental synchronization of sign_compare files
+
 
 class WortverbundSelecter(tk.Frame):
     """GUI-frame to select a wortverbund of a project and to convert it."""
@@ -70,11 +72,13 @@ class WortverbundSelecter(tk.Frame):
                 if not os.path.exists('sc_files'):
                     os.makedirs('sc_files')
                 if not os.path.exists('sc_files/'+self.wortverbund_listbox.get('active')+'.txt'):
-                    self.save_converted_file_0(0)
+                    self.save_converted_file_0(1)
                 # If a sign_compare file with the same name as the selected
                 # wortverbund_builder file already exists: 3 new options.
                 else:
                     self.label['text'] = 'A sign \"'+self.wortverbund_listbox.get('active')+'\" already exists!\nWhat do you want to do?'
+                    self.sync_button = tk.Button(self, font='Arial 16', text='Synchronize existing file (only adds new features)', width=40, command=self.save_by_synchronizing)
+                    self.sync_button.pack()
                     self.convert_button = tk.Button(self, font='Arial 16', text='Append existing file', width=40, command=self.save_by_appending)
                     self.convert_button.pack()
                     self.replace_button = tk.Button(self, font='Arial 16', text='Replace existing file (the old file will be lost)', width=40, command=self.save_by_replacing)
@@ -91,6 +95,14 @@ class WortverbundSelecter(tk.Frame):
             already existing sign_compare file by adding them to it."""
         self.save_converted_file_0(0)
 
+    def save_by_synchronizing(self):
+        """Brings an already existing sign_compare file up to date with the
+            input file (wortverbund_builder file): only the features added
+            since the last synchronization are appended; the file is only
+            written completely again if features were removed in the meantime
+            (see "wb_sync.py")."""
+        self.save_converted_file_0(2)
+
     def save_by_replacing(self):
         """Saves the features of the input file (wortverbund_builder file) in a
             "new" sign_compare file replacing the one that already existed -
@@ -103,6 +115,7 @@ class WortverbundSelecter(tk.Frame):
             new sign_compare file - i.e. creating a new file and keeping the old
             one."""
         self.convert_button.forget()
+        self.sync_button.forget()
         self.replace_button.forget()
         self.rename_button.forget()
         
@@ -115,16 +128,30 @@ class WortverbundSelecter(tk.Frame):
     def save_converted_file_0(self, case):
         self.convert_button.forget()
         try:
+            self.sync_button.forget()
             self.replace_button.forget()
             self.rename_button.forget()
         except AttributeError:
             pass
         if case == 0: # coming from "self.save_by_appending"
             sign_compare_file = open('sc_files/'+self.wortverbund_listbox.get('active')+'.txt', 'a')
-        else: # coming from "self.save_by_replacing"
-            sign_compare_file = open('sc_files/'+self.wortverbund_listbox.get('active')+'.txt', 'w')
-        sign_compare_file.write(self.feature_string)
-        sign_compare_file.close()
+            sign_compare_file.write(self.feature_string)
+            sign_compare_file.close()
+        elif case == 1: # coming from "self.save_by_replacing" (or a new file)
+            # Writes the file completely and remembers how much of the
+            # wortverbund was converted for later synchronizations.
+            wb_sync.sync(self.project, self.wortverbund_listbox.get('active'),
+                         'wb_files', 'sc_files', rewrite=True)
+        else: # coming from "self.save_by_synchronizing"
+            change, number = wb_sync.sync(self.project, self.wortverbund_listbox.get('active'),
+                                          'wb_files', 'sc_files')
+            if change == wb_sync.UNCHANGED:
+                self.label['text'] = '\"'+self.wortverbund_listbox.get('active')+'\" is already up to date!'
+            elif change == wb_sync.APPENDED:
+                self.label['text'] = '\"'+self.wortverbund_listbox.get('active')+'\" synchronized ('+str(number)+' new features added)!'
+            else:
+                self.label['text'] = '\"'+self.wortverbund_listbox.get('active')+'\" synchronized (written completely again because features were removed)!'
+            return
         self.label['text'] = '\"'+self.wortverbund_listbox.get('active')+'\" converted!'
 
     def save_converted_file_1(self): # coming from "self.rename_and_save"
@@ -132,8 +159,8 @@ class WortverbundSelecter(tk.Frame):
         self.entry.forget()
         try:
             os.rename('sc_files/'+self.wortverbund_listbox.get('active')+'.txt', 'sc_files/'+self.entry.get()+'.txt')
-            with open('sc_files/'+self.wortverbund_listbox.get('active')+'.txt', 'w') as sign_compare_file:
-                sign_compare_file.write(self.feature_string)
+            wb_sync.sync(self.project, self.wortverbund_listbox.get('active'),
+                         'wb_files', 'sc_files', rewrite=True)
             self.label['text'] = '\"'+self.wortverbund_listbox.get('active')+'\" converted and already existing file renamed \"'+self.entry.get()+'\"!'
         except:
             self.label['text'] = 'Your new file name was not accepted!'
@@ -144,26 +171,27 @@ def select_project():
     WortverbundSelecter(ROOT, project_listbox.get('active')).pack()
 
 
-ROOT = tk.Tk()
-ROOT.title('wb2sc_file_converter')
-
-# Main frame to select a wortverbund_builder project.
-ROOT_FRAME = tk.Frame(ROOT)
-project_listbox = tk.Listbox(ROOT_FRAME, font='Arial 16', height=18, width=26)
-project_listbox.pack()
-try:
-    no_projects = True
-    for project in os.listdir('wb_files'):
-        if not '.' in project:
-            project_listbox.insert('end', project)
-            no_projects = False
-    if no_projects:
-        raise IOError
-    else:
-        tk.Button(ROOT_FRAME, font='Arial 16', text='Select project', width=26, command=select_project).pack()
-except IOError:
-    project_listbox.forget()
-    tk.Label(ROOT_FRAME, font='Arial 16', text='\nThere are no wortverbund_builder projects!\n').pack()
-ROOT_FRAME.pack()
-
-ROOT.mainloop()
+if __name__ == '__main__':
+    ROOT = tk.Tk()
+    ROOT.title('wb2sc_file_converter')
+
+    # Main frame to select a wortverbund_builder project.
+    ROOT_FRAME = tk.Frame(ROOT)
+    project_listbox = tk.Listbox(ROOT_FRAME, font='Arial 16', height=18, width=26)
+    project_listbox.pack()
+    try:
+        no_projects = True
+        for project in os.listdir('wb_files'):
+            if not '.' in project:
+                project_listbox.insert('end', project)
+                no_projects = False
+        if no_projects:
+            raise IOError
+        else:
+            tk.Button(ROOT_FRAME, font='Arial 16', text='Select project', width=26, command=select_project).pack()
+    except IOError:
+        project_listbox.forget()
+        tk.Label(ROOT_FRAME, font='Arial 16', text='\nThere are no wortverbund_builder projects!\n').pack()
+    ROOT_FRAME.pack()
+
+    ROOT.mainloop()
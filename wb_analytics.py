@@ -0,0 +1,220 @@
+# wb_analytics.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Analyses how fast wortverbund grow, i.e. where a character "develops" in
+    a text.
+
+    All calculations work on the (sorted) x-values of a wortverbund with
+    NumPy:
+        - "density": number of features per unit of position within a
+          sliding window (counted with "searchsorted" at every grid point),
+        - "growth_rate": derivative (and second derivative) of the
+          cumulative number of features,
+        - "change_points": positions where the rate of new features changes,
+          found by binary segmentation of the binned feature counts (with the
+          log-likelihood of a constant rate per segment as cost).
+    "overlay" draws the results into an existing plot (e.g. of
+    "WortverbundShow" or "wb_cli.py plot")."""
+
+import os
+
+import numpy as np
+
+import wb_func
+
+
+def _sorted_array(x_values):
+    x_values = np.asarray(x_values, dtype=float)
+    if len(x_values) > 1 and np.any(x_values[1:] < x_values[:-1]):
+        x_values = np.sort(x_values)
+    return x_values
+
+
+def _grid(x_values, points, start=None, end=None):
+    if start is None:
+        start = x_values[0] if len(x_values) else 0.0
+    if end is None:
+        end = x_values[-1] if len(x_values) else 1.0
+    if end <= start:
+        end = start+1.0
+    return np.linspace(start, end, points)
+
+
+def density(x_values, window=None, points=500, start=None, end=None):
+    """Calculates the number of features per unit of position within a
+        sliding window.
+
+    Args:
+        x_values: x-values of the features of a wortverbund.
+        window: width of the window (a twentieth of the range if None).
+        points: number of grid points (centres of the window).
+        start, end: range of the grid (the range of the x-values if None).
+
+    Returns the grid points and the density at every grid point."""
+    x_values = _sorted_array(x_values)
+    grid = _grid(x_values, points, start, end)
+    if window is None:
+        window = (grid[-1]-grid[0])/20
+    counts = (np.searchsorted(x_values, grid+window/2, side='right')
+              - np.searchsorted(x_values, grid-window/2, side='left'))
+    return grid, counts/window
+
+
+def growth_rate(x_values, points=500, smoothing=None, start=None, end=None):
+    """Calculates the derivatives of the cumulative number of features (the
+        curve shown by the plots).
+
+    Args:
+        x_values: x-values of the features of a wortverbund.
+        points: number of grid points.
+        smoothing: width of a moving average applied to the cumulative
+            numbers before deriving (in grid points; none if None).
+        start, end: range of the grid (the range of the x-values if None).
+
+    Returns the grid points, the growth rate (new features per unit of
+        position) and its derivative (the acceleration) at every grid
+        point."""
+    x_values = _sorted_array(x_values)
+    grid = _grid(x_values, points, start, end)
+    cumulative = np.searchsorted(x_values, grid, side='right').astype(float)
+    if smoothing is not None and smoothing > 1:
+        kernel = np.ones(int(smoothing))/int(smoothing)
+        padded = np.pad(cumulative, (int(smoothing)//2, int(smoothing)-1-int(smoothing)//2),
+                        mode='edge')
+        cumulative = np.convolve(padded, kernel, mode='valid')
+    rate = np.gradient(cumulative, grid)
+    return grid, rate, np.gradient(rate, grid)
+
+
+def _segment_costs(prefix, first, last):
+    # Negative log-likelihood (without constants) of the counts of the bins
+    # "first" to "last" - 1 having a constant (Poisson) rate; vectorized over
+    # arrays of "first" and "last".
+    total = prefix[last]-prefix[first]
+    length = last-first
+    with np.errstate(divide='ignore', invalid='ignore'):
+        costs = -total*np.log(total/length)
+    return np.where(total > 0, costs, 0.0)
+
+
+def change_points(x_values, bins=200, penalty=None, max_change_points=10,
+                  min_size=3, start=None, end=None):
+    """Finds the positions where the rate of new features changes by binary
+        segmentation.
+
+    The features are counted in "bins" bins; every segment is split where
+    the split lowers the cost of the segment the most as long as the gain is
+    greater than "penalty".
+
+    Args:
+        x_values: x-values of the features of a wortverbund.
+        bins: number of bins.
+        penalty: minimal gain of a split (Bayesian information criterion,
+            i.e. the logarithm of the number of features, if None).
+        max_change_points: maximal number of change points.
+        min_size: minimal number of bins of a segment.
+        start, end: range of the bins (the range of the x-values if None).
+
+    Returns a list of "(position, rate before, rate after)" sorted by
+        position (the rates in features per unit of position)."""
+    x_values = _sorted_array(x_values)
+    if len(x_values) < 2:
+        return []
+    edges = _grid(x_values, bins+1, start, end)
+    counts = np.diff(np.searchsorted(x_values, edges, side='right'))
+    # The first bin includes its left edge.
+    counts[0] += (np.searchsorted(x_values, edges[0], side='right')
+                  - np.searchsorted(x_values, edges[0], side='left'))
+    prefix = np.concatenate([[0], np.cumsum(counts)]).astype(float)
+    if penalty is None:
+        penalty = np.log(max(2, len(x_values)))
+    splits = []
+    segments = [(0, bins)]
+    while segments and len(splits) < max_change_points:
+        best = None
+        for first, last in segments:
+            if last-first < 2*min_size:
+                continue
+            candidates = np.arange(first+min_size, last-min_size+1)
+            gains = (_segment_costs(prefix, np.array([first]), np.array([last]))
+                     - _segment_costs(prefix, np.full(len(candidates), first), candidates)
+                     - _segment_costs(prefix, candidates, np.full(len(candidates), last)))
+            i = int(np.argmax(gains))
+            if best is None or gains[i] > best[0]:
+                best = (gains[i], first, int(candidates[i]), last)
+        if best is None or best[0] <= penalty:
+            break
+        _, first, split, last = best
+        splits.append(split)
+        segments.remove((first, last))
+        segments += [(first, split), (split, last)]
+    splits.sort()
+    width = edges[1]-edges[0]
+    boundaries = [0]+splits+[bins]
+    rates = [(prefix[boundaries[i+1]]-prefix[boundaries[i]])/((boundaries[i+1]-boundaries[i])*width)
+             for i in range(len(boundaries)-1)]
+    return [(float(edges[split]), float(rates[i]), float(rates[i+1]))
+            for i, split in enumerate(splits)]
+
+
+def analyse(x_values, window=None, points=500, bins=200, start=None,
+            end=None):
+    """Runs all analyses on the x-values of a wortverbund.
+
+    Returns a dictionary with "grid", "density", "rate", "acceleration" and
+        "change_points" (see the functions above)."""
+    x_values = _sorted_array(x_values)
+    grid, feature_density = density(x_values, window, points, start, end)
+    _, rate, acceleration = growth_rate(x_values, points, start=start, end=end)
+    return {'grid': grid, 'density': feature_density, 'rate': rate,
+            'acceleration': acceleration,
+            'change_points': change_points(x_values, bins, start=start, end=end)}
+
+
+def analyse_project(project, wb_directory='wb_files', **options):
+    """Analyses every wortverbund of a project and the whole project (all of
+        its features together).
+
+    Returns a dictionary "wortverbund name -> result of analyse" (the whole
+        project under the key None)."""
+    results = {}
+    all_x_values = []
+    for wortverbund_file in sorted(os.listdir(wb_directory+'/'+project)):
+        _, _, _, x_values = wb_func.prepare_wortverbund(
+            wb_func.read_wortverbund(wb_directory+'/'+project+'/'+wortverbund_file))
+        results[wortverbund_file[:-4]] = analyse(x_values, **options)
+        all_x_values.append(np.asarray(x_values, dtype=float))
+    if all_x_values:
+        results[None] = analyse(np.sort(np.concatenate(all_x_values)), **options)
+    return results
+
+
+def overlay(axes, result, color='tab:green', label='Feature density',
+            density_axes=None):
+    """Draws the density and the change points of a result of "analyse" into
+        a plot of cumulative numbers of features.
+
+    The density is drawn on a second y-axis (which is returned; pass it as
+    "density_axes" to draw several densities on it), the change points as
+    vertical dashed lines."""
+    if density_axes is None:
+        density_axes = axes.twinx()
+    density_axes.plot(result['grid'], result['density'], color=color,
+                      alpha=0.7, label=label)
+    density_axes.set_ylabel('Features per unit of position')
+    for position, _, _ in result['change_points']:
+        axes.axvline(position, color=color, linestyle='--', alpha=0.6)
+    return density_axes
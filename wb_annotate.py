@@ -0,0 +1,142 @@
+# wb_annotate.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Annotates plots of wortverbund with their features without drawing every
+    single label.
+
+    The labels of the visible points are placed in priority order; a label is
+    only drawn if it does not overlap a label placed before. The placed labels
+    are kept in a grid (in display coordinates), so every candidate is only
+    compared to the labels in the grid cells it covers. The labels are placed
+    again whenever the plot is zoomed, panned or resized."""
+
+import numpy as np
+
+
+class AnnotationCuller:
+    """Draws a non-overlapping subset of labels on "axes".
+
+    Args:
+        axes: the matplotlib axes.
+        x, y: coordinates (data) of the annotated points.
+        labels: the labels (features) of the points.
+        priorities: priority of every label (higher first); the order of the
+            labels is used if None (earlier first).
+        offset: offset of the labels from their points (in points).
+        fontsize: font size of the labels (in points).
+        max_labels: maximal number of labels drawn at a time (None: no
+            limit)."""
+
+    def __init__(self, axes, x, y, labels, priorities=None, offset=(-22, 17),
+                 fontsize=10, max_labels=None):
+        self.axes = axes
+        self.points = np.column_stack([np.asarray(x, dtype=float),
+                                       np.asarray(y, dtype=float)]).reshape(-1, 2)
+        self.labels = list(labels)
+        if priorities is None:
+            self.order = np.arange(len(self.labels))
+        else:
+            self.order = np.argsort(-np.asarray(priorities, dtype=float),
+                                    kind='stable')
+        self.offset = offset
+        self.fontsize = fontsize
+        self.max_labels = max_labels
+        self.annotations = []
+        self._updating = False
+        self._callbacks = [axes.callbacks.connect('xlim_changed', self._on_change),
+                           axes.callbacks.connect('ylim_changed', self._on_change)]
+        self._resize_callback = axes.figure.canvas.mpl_connect('resize_event',
+                                                                self._on_change)
+        self.update()
+
+    def disconnect(self):
+        for callback in self._callbacks:
+            self.axes.callbacks.disconnect(callback)
+        self.axes.figure.canvas.mpl_disconnect(self._resize_callback)
+
+    def _on_change(self, *args):
+        # Zooming changes both limits; the guard avoids placing the labels
+        # again while they are being placed.
+        if not self._updating:
+            self.update()
+            self.axes.figure.canvas.draw_idle()
+
+    def _label_sizes(self):
+        # Estimates the extent of the labels (in pixels) from their lengths,
+        # which is much faster than measuring rendered texts.
+        pixels_per_point = self.axes.figure.dpi/72
+        character_width = 0.6*self.fontsize*pixels_per_point
+        height = 1.3*self.fontsize*pixels_per_point
+        return [(len(label)*character_width, height) for label in self.labels]
+
+    def select(self):
+        """Returns the indices of the labels to draw at the current view."""
+        if not len(self.points):
+            return []
+        # Makes matplotlib apply pending autoscaling before transforming.
+        self.axes.get_xlim()
+        self.axes.get_ylim()
+        display = self.axes.transData.transform(self.points)
+        window = self.axes.bbox
+        pixels_per_point = self.axes.figure.dpi/72
+        dx = self.offset[0]*pixels_per_point
+        dy = self.offset[1]*pixels_per_point
+        visible = ((display[:, 0] >= window.x0) & (display[:, 0] <= window.x1)
+                   & (display[:, 1] >= window.y0) & (display[:, 1] <= window.y1))
+        sizes = self._label_sizes()
+        cell_size = max(1.0, 2*1.3*self.fontsize*pixels_per_point)
+        grid = {}
+        selected = []
+        for i in self.order[visible[self.order]]:
+            if not self.labels[i]:
+                continue
+            width, height = sizes[i]
+            x0 = display[i, 0]+dx
+            y0 = display[i, 1]+dy
+            box = (x0, y0, x0+width, y0+height)
+            cells = [(column, row)
+                     for column in range(int(box[0]//cell_size), int(box[2]//cell_size)+1)
+                     for row in range(int(box[1]//cell_size), int(box[3]//cell_size)+1)]
+            if any(_overlap(box, other) for cell in cells for other in grid.get(cell, ())):
+                continue
+            for cell in cells:
+                grid.setdefault(cell, []).append(box)
+            selected.append(i)
+            if self.max_labels is not None and len(selected) >= self.max_labels:
+                break
+        return selected
+
+    def update(self):
+        """Replaces the drawn labels by the ones fitting the current view."""
+        self._updating = True
+        try:
+            for annotation in self.annotations:
+                annotation.remove()
+            self.annotations = []
+            for i in self.select():
+                self.annotations.append(
+                    self.axes.annotate(self.labels[i], tuple(self.points[i]),
+                                       xytext=self.offset,
+                                       textcoords='offset points',
+                                       fontsize=self.fontsize,
+                                       arrowprops=dict(arrowstyle='-')))
+        finally:
+            self._updating = False
+
+
+def _overlap(box, other):
+    return (box[0] < other[2] and other[0] < box[2]
+            and box[1] < other[3] and other[1] < box[3])
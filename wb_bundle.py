@@ -0,0 +1,376 @@
+# wb_bundle.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Packs a project into a single compressed file (a bundle) and unpacks it
+    again, e.g. to move it between machines.
+
+    A bundle consists of independently compressed members followed by an
+    index and a footer:
+        - "metadata.json": name and kind of the project, names and sizes of
+          its wortverbund,
+        - "wortverbund/<name>.csv": the wortverbund files as they are,
+        - "x_values/<name>.csv" (optional): the sorted features with their
+          positions and x-values ("feature;position;x-value"), so they can be
+          plotted without sorting and encoding them again,
+        - the index (JSON): offset, compressed and uncompressed size, CRC-32
+          and compression of every member,
+        - the footer: "FOOTER_MAGIC", offset and size of the index.
+    The members are compressed with zstd (if the package "zstandard" is
+    installed) or gzip. Packing and unpacking copy the members in chunks, so
+    only a chunk is held in memory at a time (decompressing never returns
+    more than "CHUNK_SIZE" bytes at once, however well a damaged or
+    malicious member compresses); single members can be read without
+    unpacking the others."""
+
+import csv
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import wb_func
+
+MAGIC = b'WBBUNDLE1\n'
+FOOTER_MAGIC = b'WBBINDEX'
+FOOTER = struct.Struct('<8sQQ')
+CHUNK_SIZE = 1 << 20
+MAX_METADATA_SIZE = 1 << 26
+COMPRESSIONS = ('zstd', 'gzip')
+DECOMPRESSION_ERRORS = (zlib.error,)+((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class BundleError(ValueError):
+    """Raised if a file is not a (valid) bundle."""
+
+
+def _compressor(compression):
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError('Compressing with zstd needs the package \"zstandard\"')
+        return zstandard.ZstdCompressor().compressobj()
+    return zlib.compressobj(6, zlib.DEFLATED, 31) # gzip format
+
+
+class _MemberInput:
+    # Reads the (compressed) bytes of a member, but not beyond them.
+
+    def __init__(self, bundle_input, offset, length):
+        self.input = bundle_input
+        self.input.seek(offset)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.input.read(size)
+        if len(data) < size:
+            raise BundleError('The bundle is truncated')
+        self.remaining -= len(data)
+        return data
+
+
+def _decompressed_chunks(compression, member_input):
+    # Yields the decompressed content of a member in chunks of at most
+    # "CHUNK_SIZE" bytes.
+    if compression == 'zstd':
+        if zstandard is None:
+            raise BundleError('Reading zstd members needs the package \"zstandard\"')
+        reader = zstandard.ZstdDecompressor().stream_reader(member_input)
+        yield from iter(lambda: reader.read(CHUNK_SIZE), b'')
+        return
+    decompressor = zlib.decompressobj(31)
+    while not decompressor.eof:
+        data = decompressor.unconsumed_tail or member_input.read(CHUNK_SIZE)
+        if not data:
+            raise BundleError('The bundle is truncated')
+        chunk = decompressor.decompress(data, CHUNK_SIZE)
+        if chunk:
+            yield chunk
+
+
+class _BundleWriter:
+    # Writes members one after another (without seeking, so the bundle can
+    # also be written into a pipe) and finally the index and the footer.
+
+    def __init__(self, output, compression):
+        self.output = output
+        self.compression = compression
+        self.offset = 0
+        self.index = {}
+        self._write(MAGIC)
+
+    def _write(self, data):
+        self.output.write(data)
+        self.offset += len(data)
+
+    def add(self, name, chunks):
+        """Adds a member from an iterable of byte strings."""
+        compressor = _compressor(self.compression)
+        offset = self.offset
+        size = 0
+        crc = 0
+        for chunk in chunks:
+            size += len(chunk)
+            crc = zlib.crc32(chunk, crc)
+            self._write(compressor.compress(chunk))
+        self._write(compressor.flush())
+        self.index[name] = {'offset': offset, 'length': self.offset-offset,
+                            'size': size, 'crc32': crc,
+                            'compression': self.compression}
+
+    def close(self):
+        index = json.dumps(self.index, ensure_ascii=False).encode('utf-8')
+        index_offset = self.offset
+        self._write(index)
+        self._write(FOOTER.pack(FOOTER_MAGIC, index_offset, len(index)))
+
+
+def _file_chunks(path):
+    with open(path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(CHUNK_SIZE), b''):
+            yield chunk
+
+
+def _x_value_chunks(path):
+    # Sorts and encodes a wortverbund (which is held in memory for that) and
+    # yields its rows with their x-values as csv.
+    content_list, _, _, x_values = wb_func.prepare_wortverbund(wb_func.read_wortverbund(path))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';', lineterminator='\n')
+    for row, x_value in zip(content_list, x_values):
+        writer.writerow([row[0], wb_func.format_position(row[1]), repr(x_value)])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def export_bundle(project, path, wb_directory='wb_files', compression=None,
+                  x_values=False):
+    """Packs a project into a bundle.
+
+    Args:
+        project: name of the project.
+        path: path of the bundle (or a binary file object to write into).
+        wb_directory: directory of the projects.
+        compression: one of "COMPRESSIONS"; zstd if available, otherwise gzip
+            if None.
+        x_values: if True, the sorted features with their x-values are
+            packed as well (every wortverbund is held in memory for that, one
+            at a time).
+
+    Returns the index of the bundle."""
+    if compression is None:
+        compression = 'zstd' if zstandard is not None else 'gzip'
+    if compression not in COMPRESSIONS:
+        raise ValueError('Unknown compression \"'+str(compression)+'\"')
+    project_directory = wb_directory+'/'+project
+    wortverbund_names = sorted(wortverbund_file[:-4] for wortverbund_file in
+                               os.listdir(project_directory))
+    metadata = {'project': project, 'kind': project[-4:],
+                'wortverbund': {wortverbund: os.path.getsize(project_directory+'/'+wortverbund+'.csv')
+                                for wortverbund in wortverbund_names},
+                'x_values': x_values}
+    if isinstance(path, (str, os.PathLike)):
+        output = open(path, 'wb')
+    else:
+        output = path
+    try:
+        writer = _BundleWriter(output, compression)
+        writer.add('metadata.json', [json.dumps(metadata, ensure_ascii=False).encode('utf-8')])
+        for wortverbund in wortverbund_names:
+            writer.add('wortverbund/'+wortverbund+'.csv',
+                       _file_chunks(project_directory+'/'+wortverbund+'.csv'))
+            if x_values:
+                writer.add('x_values/'+wortverbund+'.csv',
+                           _x_value_chunks(project_directory+'/'+wortverbund+'.csv'))
+        writer.close()
+    except BaseException:
+        if output is not path:
+            output.close()
+            os.remove(path)
+        raise
+    if output is not path:
+        output.close()
+    return writer.index
+
+
+class BundleReader:
+    """Reads single members of a bundle.
+
+    Args:
+        path: path of the bundle (or a seekable binary file object).
+
+    Use it as context manager (or call "close")."""
+
+    def __init__(self, path):
+        if isinstance(path, (str, os.PathLike)):
+            self.input = open(path, 'rb')
+            self._owns_input = True
+        else:
+            self.input = path
+            self._owns_input = False
+        try:
+            self.input.seek(0)
+            if self.input.read(len(MAGIC)) != MAGIC:
+                raise BundleError('Not a wortverbund bundle')
+            self.input.seek(-FOOTER.size, os.SEEK_END)
+            magic, index_offset, index_length = FOOTER.unpack(self.input.read(FOOTER.size))
+            if magic != FOOTER_MAGIC:
+                raise BundleError('The bundle is incomplete (no index found)')
+            self.input.seek(index_offset)
+            self.index = json.loads(self.input.read(index_length).decode('utf-8'))
+            if 'metadata.json' not in self.index:
+                raise BundleError('The bundle has no metadata')
+            if self.index['metadata.json']['size'] > MAX_METADATA_SIZE:
+                raise BundleError('The metadata of the bundle are too large')
+            self.metadata = json.loads(self.read('metadata.json').decode('utf-8'))
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._owns_input:
+            self.input.close()
+
+    @property
+    def project(self):
+        return self.metadata['project']
+
+    def wortverbund_names(self):
+        return sorted(self.metadata['wortverbund'])
+
+    def chunks(self, name):
+        """Yields the uncompressed content of a member in chunks of at most
+            "CHUNK_SIZE" bytes (checking its size and CRC-32)."""
+        try:
+            entry = self.index[name]
+        except KeyError:
+            raise KeyError('The bundle has no member \"'+name+'\"')
+        member_input = _MemberInput(self.input, entry['offset'], entry['length'])
+        chunks = _decompressed_chunks(entry['compression'], member_input)
+        size = 0
+        crc = 0
+        while True:
+            try:
+                chunk = next(chunks, None)
+            except DECOMPRESSION_ERRORS as error:
+                raise BundleError('The member \"'+name+'\" is damaged') from error
+            if chunk is None:
+                break
+            size += len(chunk)
+            if size > entry['size']:
+                raise BundleError('The member \"'+name+'\" is damaged')
+            crc = zlib.crc32(chunk, crc)
+            yield chunk
+        if size != entry['size'] or crc != entry['crc32']:
+            raise BundleError('The member \"'+name+'\" is damaged')
+
+    def read(self, name):
+        return b''.join(self.chunks(name))
+
+    def read_wortverbund(self, wortverbund):
+        """Returns the "content_list" of a wortverbund (see
+            "wb_func.read_wortverbund")."""
+        text = self.read('wortverbund/'+wortverbund+'.csv').decode('utf-8')
+        content_list = []
+        for row in csv.reader(text.splitlines(), delimiter=';'):
+            content_list.append([row[0], [int(value) for value in row[1].split('/')]])
+        return content_list
+
+    def read_x_values(self, wortverbund):
+        """Returns the sorted "content_list" of a wortverbund and its x-values
+            (if they were packed, see "export_bundle")."""
+        text = self.read('x_values/'+wortverbund+'.csv').decode('utf-8')
+        content_list = []
+        x_values = []
+        for row in csv.reader(text.splitlines(), delimiter=';'):
+            content_list.append([row[0], [int(value) for value in row[1].split('/')]])
+            x_values.append(float(row[2]))
+        return content_list, x_values
+
+
+def _check_name(name):
+    # Names from a bundle become file and directory names, so they must not
+    # lead out of the project (or into the hidden directories of
+    # "wb_files").
+    if (not isinstance(name, str) or not name or '/' in name or '\\' in name
+            or '\0' in name or name.startswith('.')):
+        raise BundleError('The bundle contains the invalid name "'+str(name)+'"')
+    return name
+
+
+def _check_target(path, directory):
+    # Makes sure "path" resolves to a place inside "directory".
+    directory = os.path.realpath(directory)
+    if os.path.commonpath([os.path.realpath(path), directory]) != directory:
+        raise BundleError('The bundle would write outside of "'+directory+'"')
+    return path
+
+
+def import_bundle(path, wb_directory='wb_files', project=None):
+    """Unpacks a bundle into a new project.
+
+    Args:
+        path: path of the bundle (or a seekable binary file object).
+        wb_directory: directory of the projects.
+        project: name of the new project; the name of the packed project if
+            None.
+
+    Returns the name of the new project.
+
+    Raises FileExistsError if the project exists already and "BundleError"
+    if a name in the bundle is not a plain file name. The files are
+    unpacked into a temporary directory that is renamed when complete, so a
+    failed import leaves no half project behind."""
+    with BundleReader(path) as reader:
+        if project is None:
+            project = reader.project
+        _check_name(project)
+        wortverbund_names = [_check_name(wortverbund) for wortverbund in reader.wortverbund_names()]
+        _check_target(wb_directory+'/'+project, wb_directory)
+        if os.path.exists(wb_directory+'/'+project):
+            raise FileExistsError('The project \"'+project+'\" exists already')
+        os.makedirs(wb_directory+'/.tmp', exist_ok=True)
+        temp_directory = tempfile.mkdtemp(dir=wb_directory+'/.tmp')
+        try:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temp_directory, 0o777 & ~umask) # not only for the owner
+            for wortverbund in wortverbund_names:
+                with open(_check_target(temp_directory+'/'+wortverbund+'.csv', temp_directory),
+                          'wb') as wortverbund_file:
+                    for chunk in reader.chunks('wortverbund/'+wortverbund+'.csv'):
+                        wortverbund_file.write(chunk)
+            os.rename(temp_directory, wb_directory+'/'+project)
+        except BaseException:
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            raise
+    return project
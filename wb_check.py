@@ -0,0 +1,223 @@
+# wb_check.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checks the wortverbund files of all projects for rows that can't be read
+    (and repairs them if asked to).
+
+    Every line has to be "feature;position" with a non-empty feature and a
+    position of integers separated by "/" (e.g. "134/12"). The files are
+    checked in parallel, each one streamed line by line. Files that were
+    clean at the last check are skipped as long as their checksum did not
+    change (the checksums are kept in "wb_files/.cache/check.json").
+
+    Repairing rewrites a file atomically (see "wb_lock.rewrite", so the old
+    content stays in the journal): empty parts of positions (e.g. "12/") and
+    surrounding spaces are removed, blank lines are dropped and so are the
+    lines that can't be repaired otherwise."""
+
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import re
+
+import wb_lock
+
+ROW_PATTERN = re.compile(r'^([^;"]+);(-?\d+(?:/-?\d+)*)$')
+POSITION_PATTERN = re.compile(r'^-?\d+(?:/-?\d+)*$')
+CACHE_PATH = '.cache/check.json'
+
+
+def valid_position(position):
+    """Returns True if "position" (a string) is a valid position, e.g.
+        "134/12"."""
+    return POSITION_PATTERN.match(position) is not None
+
+
+def check_line(line):
+    """Returns the error in a line (without line break) of a wortverbund file
+        or None if it is valid."""
+    if ROW_PATTERN.match(line):
+        return None
+    if not line.strip():
+        return 'blank line'
+    # Features can be quoted (e.g. if they contain ";").
+    row = next(csv.reader([line], delimiter=';'))
+    if len(row) < 2:
+        return 'missing \";\" between feature and position'
+    if len(row) > 2:
+        return 'too many \";\"'
+    if not row[0]:
+        return 'empty feature'
+    if not row[1]:
+        return 'missing position'
+    if not valid_position(row[1]):
+        if any(not part for part in row[1].split('/')):
+            return 'empty part in position \"'+row[1]+'\"'
+        return 'position \"'+row[1]+'\" is not made of integers separated by \"/\"'
+    return None
+
+
+def repair_line(line):
+    """Returns a repaired version of an invalid line or None if it can't be
+        repaired (or is blank)."""
+    if not line.strip():
+        return None
+    row = next(csv.reader([line], delimiter=';'))
+    if len(row) != 2 or not row[0].strip():
+        return None
+    position = '/'.join(part.strip() for part in row[1].split('/') if part.strip())
+    if not valid_position(position):
+        return None
+    if row[0] != row[0].strip() or ';' in row[0] or '"' in row[0]:
+        return _format_row(row[0].strip(), position)
+    return row[0]+';'+position
+
+
+def _format_row(feature, position):
+    # Quotes the feature if necessary (in the same way as it is read).
+    if ';' in feature or '"' in feature:
+        feature = '\"'+feature.replace('\"', '\"\"')+'\"'
+    return feature+';'+position
+
+
+def check_file(path, clean_checksum=None):
+    """Checks a wortverbund file line by line.
+
+    Args:
+        path: path of the wortverbund file.
+        clean_checksum: checksum of the file at its last clean check; the
+            lines are not checked if the checksum did not change.
+
+    Returns:
+        checksum: the checksum of the file.
+        errors: list of "(line number, error, line)" (line numbers start at
+            1); None if the file was skipped."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as wortverbund_file:
+        for block in iter(lambda: wortverbund_file.read(1 << 20), b''):
+            digest.update(block)
+    checksum = digest.hexdigest()
+    if checksum == clean_checksum:
+        return checksum, None
+    errors = []
+    with open(path, 'rb') as wortverbund_file:
+        for number, raw_line in enumerate(wortverbund_file, 1):
+            try:
+                line = raw_line.decode('utf-8').rstrip('\r\n')
+            except UnicodeDecodeError:
+                errors.append((number, 'not encoded in UTF-8',
+                               raw_line.decode('utf-8', 'replace').rstrip('\r\n')))
+                continue
+            error = check_line(line)
+            if error is not None:
+                errors.append((number, error, line))
+    return checksum, errors
+
+
+def repair(project, wortverbund, wb_directory='wb_files'):
+    """Repairs a wortverbund file (see above).
+
+    Returns the number of repaired and the number of removed lines."""
+    path = wb_directory+'/'+project+'/'+wortverbund+'.csv'
+    expected_version = wb_lock.version(path)
+    repaired = 0
+    removed = 0
+    lines = []
+    with open(path, 'rb') as wortverbund_file:
+        for raw_line in wortverbund_file:
+            try:
+                line = raw_line.decode('utf-8').rstrip('\r\n')
+                encoded = True
+            except UnicodeDecodeError:
+                # Undecodable bytes are replaced by "\ufffd".
+                line = raw_line.decode('utf-8', 'replace').rstrip('\r\n')
+                encoded = False
+            if check_line(line) is None:
+                lines.append(line)
+                if not encoded:
+                    repaired += 1
+                continue
+            repaired_line = repair_line(line)
+            if repaired_line is None:
+                removed += 1
+            else:
+                lines.append(repaired_line)
+                repaired += 1
+    if repaired or removed:
+        wb_lock.rewrite(project, wortverbund, ''.join(line+'\n' for line in lines),
+                        expected_version, wb_directory)
+    return repaired, removed
+
+
+def _read_cache(wb_directory):
+    try:
+        with open(wb_directory+'/'+CACHE_PATH, 'r') as cache_file:
+            return json.load(cache_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_cache(wb_directory, cache):
+    os.makedirs(os.path.dirname(wb_directory+'/'+CACHE_PATH), exist_ok=True)
+    wb_lock.atomic_write(wb_directory+'/'+CACHE_PATH, json.dumps(cache))
+
+
+def check_projects(projects=None, wb_directory='wb_files', repair_files=False,
+                   workers=None, use_cache=True):
+    """Checks (and repairs) the wortverbund files of projects in parallel.
+
+    Args:
+        projects: names of the projects to check (all projects if None).
+        wb_directory: directory of the projects.
+        repair_files: if True, files with errors are repaired.
+        workers: number of processes (as many as CPUs if None).
+        use_cache: if False, files are checked even if they did not change
+            since their last clean check.
+
+    Yields "(project, wortverbund, errors, repaired)" for every checked file
+        in the order of the projects: "errors" as returned by "check_file"
+        (None if the file was skipped), "repaired" as returned by "repair"
+        (None if it was not repaired)."""
+    if projects is None:
+        projects = sorted(project for project in os.listdir(wb_directory)
+                          if not '.' in project)
+    files = [(project, wortverbund_file[:-4])
+             for project in projects
+             for wortverbund_file in sorted(os.listdir(wb_directory+'/'+project))]
+    cache = _read_cache(wb_directory) if use_cache else {}
+    new_cache = dict(cache)
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(check_file,
+                                   wb_directory+'/'+project+'/'+wortverbund+'.csv',
+                                   cache.get(project+'/'+wortverbund))
+                   for project, wortverbund in files]
+        try:
+            for (project, wortverbund), future in zip(files, futures):
+                checksum, errors = future.result()
+                repaired = None
+                if errors:
+                    new_cache.pop(project+'/'+wortverbund, None)
+                    if repair_files:
+                        repaired = repair(project, wortverbund, wb_directory)
+                else:
+                    new_cache[project+'/'+wortverbund] = checksum
+                yield project, wortverbund, errors, repaired
+        finally:
+            for future in futures:
+                future.cancel()
+            _write_cache(wb_directory, new_cache)
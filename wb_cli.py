@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+
+# wb_cli.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A command-line interface to query wortverbund_builder projects without a
+    display, e.g.:
+
+        python -m wortverbund_builder query irrungen-wirrungen_page "Frau Dörr" --start 6/1 --end 50/40
+        python -m wortverbund_builder --format csv stats irrungen-wirrungen_page
+        python -m wortverbund_builder timeline project_1_date project_2_date --start 1870 --end 1880
+        python -m wortverbund_builder plot irrungen-wirrungen_page --output plot.png
+
+    Results are streamed line by line as NDJSON (default) or CSV. The same
+    loading, sorting and encoding code as in "WortverbundShow" is used (see
+    "wb_func.py"); no GUI modules are imported (matplotlib only for "plot")."""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+
+import wb_func
+
+WB_DIRECTORY = 'wb_files'
+
+
+def iter_projects(wb_directory=WB_DIRECTORY):
+    for project in sorted(os.listdir(wb_directory)):
+        if not '.' in project:
+            yield project
+
+
+def iter_wortverbund_names(project, wb_directory=WB_DIRECTORY):
+    for wortverbund_file in sorted(os.listdir(wb_directory+'/'+project)):
+        yield wortverbund_file[:-4]
+
+
+def load(project, wortverbund, wb_directory=WB_DIRECTORY):
+    """Returns the result of "wb_func.prepare_wortverbund" for a wortverbund."""
+    return wb_func.prepare_wortverbund(
+        wb_func.read_wortverbund(wb_directory+'/'+project+'/'+wortverbund+'.csv'))
+
+
+def list_records(args):
+    if args.project is None:
+        for project in iter_projects(args.wb_directory):
+            yield {'project': project}
+    else:
+        for wortverbund in iter_wortverbund_names(args.project, args.wb_directory):
+            yield {'project': args.project, 'wortverbund': wortverbund}
+
+
+def query_external(args, wortverbund):
+    """Queries a wortverbund with bounded memory (see "wb_extsort.py")."""
+    import wb_extsort
+
+    with wb_extsort.ExternalWortverbund(args.wb_directory+'/'+args.project+'/'+wortverbund+'.csv',
+                                        args.chunk_size) as external_wortverbund:
+        for number, (_, feature, position, x_value) in enumerate(external_wortverbund.query(args.start, args.end)):
+            if args.limit is not None and number >= args.limit:
+                break
+            yield {'project': args.project, 'wortverbund': wortverbund,
+                   'feature': feature,
+                   'position': wb_func.format_position(position),
+                   'x_value': x_value}
+
+
+def query_records(args):
+    for wortverbund in args.wortverbund or iter_wortverbund_names(args.project, args.wb_directory):
+        if args.chunk_size is not None:
+            yield from query_external(args, wortverbund)
+            continue
+        content_list, smallest_values, highest_values, x_values = load(args.project, wortverbund,
+                                                                       args.wb_directory)
+        indices = wb_func.features_in_range(content_list, x_values, args.start,
+                                            args.end, smallest_values,
+                                            highest_values)
+        for number, i in enumerate(indices):
+            if args.limit is not None and number >= args.limit:
+                break
+            yield {'project': args.project, 'wortverbund': wortverbund,
+                   'feature': content_list[i][0],
+                   'position': wb_func.format_position(content_list[i][1]),
+                   'x_value': x_values[i]}
+
+
+def timeline_records(args):
+    """Merges the features of several projects into one chronological stream
+        (see "wb_timeline.py")."""
+    import wb_timeline
+
+    for position, project, wortverbund, feature, x_value in wb_timeline.query(
+            args.projects, args.start, args.end, args.limit, args.wb_directory,
+            args.chunk_size):
+        yield {'project': project, 'wortverbund': wortverbund,
+               'feature': feature,
+               'position': wb_func.format_position(position),
+               'x_value': x_value}
+
+
+def stats_records(args):
+    for wortverbund in args.wortverbund or iter_wortverbund_names(args.project, args.wb_directory):
+        content_list, _, _, x_values = load(args.project, wortverbund,
+                                            args.wb_directory)
+        record = {'project': args.project, 'wortverbund': wortverbund,
+                  'features': len(content_list),
+                  'distinct_features': len({row[0] for row in content_list}),
+                  'first_position': None, 'last_position': None,
+                  'first_x_value': None, 'last_x_value': None}
+        if content_list:
+            record.update(first_position=wb_func.format_position(content_list[0][1]),
+                          last_position=wb_func.format_position(content_list[-1][1]),
+                          first_x_value=x_values[0], last_x_value=x_values[-1])
+        yield record
+
+
+def plot_records(args):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure = plt.figure()
+    plt.xlabel('Position of addition of a feature ('+args.project[-4:]+' of occurrence)')
+    plt.ylabel('Number of features')
+    wortverbund_names = list(args.wortverbund or iter_wortverbund_names(args.project, args.wb_directory))
+    annotations = []
+    analytics = []
+    for wortverbund in wortverbund_names:
+        if args.chunk_size is not None:
+            # Plots a thinned out curve with bounded memory (without
+            # annotations).
+            import wb_extsort
+
+            with wb_extsort.ExternalWortverbund(args.wb_directory+'/'+args.project+'/'+wortverbund+'.csv',
+                                                args.chunk_size) as external_wortverbund:
+                positions, numbers = external_wortverbund.plot_points(args.start, args.end)
+            plt.plot(positions, numbers, label=wortverbund)
+            plt.plot(positions, numbers, '.')
+            continue
+        content_list, smallest_values, highest_values, x_values = load(args.project, wortverbund,
+                                                                       args.wb_directory)
+        indices = list(wb_func.features_in_range(content_list, x_values,
+                                                 args.start, args.end,
+                                                 smallest_values,
+                                                 highest_values))
+        positions = [x_values[i] for i in indices]
+        numbers = [i+1 for i in indices]
+        plt.plot(positions, numbers, label=wortverbund)
+        plt.plot(positions, numbers, '.')
+        if args.annotate:
+            annotations.append((positions, numbers,
+                                [content_list[i][0] for i in indices]))
+        if args.analytics and len(positions) > 1:
+            analytics.append((wortverbund, positions))
+    if len(wortverbund_names) > 1:
+        plt.legend(loc='upper left')
+    plt.grid(alpha=0.4)
+    if annotations:
+        # The labels are placed once the limits of the plot are final.
+        import wb_annotate
+
+        wb_annotate.AnnotationCuller(plt.gca(),
+                                     [x for positions, _, _ in annotations for x in positions],
+                                     [y for _, numbers, _ in annotations for y in numbers],
+                                     [label for _, _, labels in annotations for label in labels])
+    if analytics:
+        # Draws the density of the features and its change points (see
+        # "wb_analytics.py").
+        import wb_analytics
+
+        density_axes = None
+        for i, (wortverbund, positions) in enumerate(analytics):
+            density_axes = wb_analytics.overlay(plt.gca(), wb_analytics.analyse(positions),
+                                                color='C'+str(i % 10),
+                                                label='Density of '+wortverbund,
+                                                density_axes=density_axes)
+    figure.savefig(args.output)
+    plt.close(figure)
+    yield {'project': args.project, 'output': args.output}
+
+
+def analytics_records(args):
+    """Yields the positions where the rate of new features changes (see
+        "wb_analytics.change_points")."""
+    import wb_analytics
+
+    for wortverbund in args.wortverbund or iter_wortverbund_names(args.project, args.wb_directory):
+        content_list, smallest_values, highest_values, x_values = load(args.project, wortverbund,
+                                                                       args.wb_directory)
+        indices = wb_func.features_in_range(content_list, x_values, args.start,
+                                            args.end, smallest_values,
+                                            highest_values)
+        for position, rate_before, rate_after in wb_analytics.change_points(
+                [x_values[i] for i in indices], args.bins, args.penalty,
+                args.max_change_points):
+            yield {'project': args.project, 'wortverbund': wortverbund,
+                   'position': position, 'rate_before': rate_before,
+                   'rate_after': rate_after}
+
+
+def convert_records(args):
+    """Converts wortverbund into sign_compare files (like
+        "wb2sc_file_converter.py")."""
+    os.makedirs(args.sc_directory, exist_ok=True)
+    for wortverbund in args.wortverbund or iter_wortverbund_names(args.project, args.wb_directory):
+        if args.mode == 'sync':
+            # Only converts the features added since the last run (see
+            # "wb_sync.py").
+            import wb_sync
+
+            change, number = wb_sync.sync(args.project, wortverbund,
+                                          args.wb_directory, args.sc_directory)
+            yield {'wortverbund': wortverbund, 'converted': change != wb_sync.UNCHANGED,
+                   'change': change, 'features': number}
+            continue
+        feature_string = ''
+        with open(args.wb_directory+'/'+args.project+'/'+wortverbund+'.csv', 'r') as csv_file:
+            for row in csv.reader(csv_file, delimiter=';'):
+                if row[0]:
+                    feature_string += row[0]+';'
+        if not feature_string:
+            yield {'wortverbund': wortverbund, 'converted': False}
+            continue
+        with open(args.sc_directory+'/'+wortverbund+'.txt',
+                  'a' if args.mode == 'append' else 'w') as sign_compare_file:
+            sign_compare_file.write(feature_string)
+        yield {'wortverbund': wortverbund, 'converted': True}
+
+
+def check_records(args):
+    """Checks (and repairs) the wortverbund files of projects (see
+        "wb_check.py"); only errors and repairs are listed."""
+    import wb_check
+
+    for project, wortverbund, errors, repaired in wb_check.check_projects(
+            args.projects or None, args.wb_directory, args.repair, args.workers):
+        for line_number, error, line in errors or ():
+            yield {'project': project, 'wortverbund': wortverbund,
+                   'line': line_number, 'error': error, 'text': line}
+        if repaired is not None:
+            yield {'project': project, 'wortverbund': wortverbund, 'line': None,
+                   'error': None,
+                   'text': 'repaired '+str(repaired[0])+' and removed '+str(repaired[1])+' lines'}
+
+
+def pack_records(args):
+    """Packs a project into a single bundle file (see "wb_bundle.py")."""
+    import wb_bundle
+
+    index = wb_bundle.export_bundle(args.project, args.output, args.wb_directory,
+                                    args.compression, args.x_values)
+    yield {'project': args.project, 'output': args.output,
+           'members': len(index),
+           'size': sum(entry['size'] for entry in index.values()),
+           'compressed_size': sum(entry['length'] for entry in index.values())}
+
+
+def unpack_records(args):
+    """Unpacks a bundle file into a new project (see "wb_bundle.py")."""
+    import wb_bundle
+
+    yield {'project': wb_bundle.import_bundle(args.bundle, args.wb_directory,
+                                              args.project),
+           'bundle': args.bundle}
+
+
+def _moment(text):
+    # Times are entered as ISO dates, e.g. "2019-03-01" or "2019-03-01T12:00".
+    return datetime.datetime.fromisoformat(text) if text else None
+
+
+def _line_record(line):
+    feature, _, position = line.rpartition(';')
+    return {'feature': feature, 'position': position}
+
+
+def history_records(args):
+    """Lists the recorded changes of a wortverbund, its state at a time
+        ("--at") or the changes since a time ("--since"; see
+        "wb_journal.py")."""
+    import wb_journal
+
+    if args.since is not None:
+        added, removed = wb_journal.diff(args.project, args.wortverbund,
+                                         _moment(args.since), _moment(args.at),
+                                         args.wb_directory)
+        for line in added:
+            yield dict(change='added', **_line_record(line))
+        for line in removed:
+            yield dict(change='removed', **_line_record(line))
+    elif args.at is not None:
+        lines = wb_journal.reconstruct(args.project, args.wortverbund,
+                                       _moment(args.at), args.wb_directory)
+        if lines is None:
+            raise ValueError('"'+args.wortverbund+'" wasn\'t recorded at '+args.at)
+        for line in lines:
+            yield _line_record(line)
+    else:
+        for number, moment, operation in wb_journal.history(args.project, args.wortverbund,
+                                                            args.wb_directory):
+            record = {'number': number,
+                      'time': datetime.datetime.fromtimestamp(moment).isoformat(timespec='seconds'),
+                      'op': operation['op'], 'feature': None, 'position': None}
+            if 'line' in operation:
+                record.update(_line_record(operation['line']))
+            yield record
+
+
+def write_records(records, output_format, output=sys.stdout):
+    """Writes records (dictionaries) one by one as NDJSON or CSV (the header
+        of the CSV output is taken from the first record)."""
+    writer = None
+    for record in records:
+        if output_format == 'csv':
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(record),
+                                        lineterminator='\n')
+                writer.writeheader()
+            writer.writerow(record)
+        else:
+            output.write(json.dumps(record, ensure_ascii=False)+'\n')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='wortverbund_builder',
+                                     description='Query wortverbund_builder projects.')
+    parser.add_argument('--wb-directory', default=WB_DIRECTORY,
+                        help='directory of the projects (default: %(default)s)')
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson',
+                        help='output format (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='list projects or the wortverbund of a project')
+    list_parser.add_argument('project', nargs='?')
+    list_parser.set_defaults(records=list_records)
+
+    def add_selection(subparser):
+        subparser.add_argument('project')
+        subparser.add_argument('wortverbund', nargs='*',
+                               help='wortverbund to use (default: all of the project)')
+
+    def add_range(subparser):
+        subparser.add_argument('--start', help='start position, e.g. "6/1"')
+        subparser.add_argument('--end', help='end position, e.g. "50/40"')
+        subparser.add_argument('--chunk-size', type=int,
+                               help='sort and encode out of core, holding at most this many features in memory')
+
+    query_parser = subparsers.add_parser('query', help='features within a range')
+    add_selection(query_parser)
+    add_range(query_parser)
+    query_parser.add_argument('--limit', type=int,
+                              help='maximal number of features per wortverbund')
+    query_parser.set_defaults(records=query_records)
+
+    timeline_parser = subparsers.add_parser('timeline', help='features of several projects in chronological order')
+    timeline_parser.add_argument('projects', nargs='+')
+    add_range(timeline_parser)
+    timeline_parser.add_argument('--limit', type=int,
+                                 help='maximal number of features')
+    timeline_parser.set_defaults(records=timeline_records)
+
+    stats_parser = subparsers.add_parser('stats', help='statistics of wortverbund')
+    add_selection(stats_parser)
+    stats_parser.set_defaults(records=stats_records)
+
+    plot_parser = subparsers.add_parser('plot', help='plot wortverbund into an image file')
+    add_selection(plot_parser)
+    add_range(plot_parser)
+    plot_parser.add_argument('--output', required=True,
+                             help='image file, e.g. "plot.png"')
+    plot_parser.add_argument('--annotate', action='store_true',
+                             help='annotate the features')
+    plot_parser.add_argument('--analytics', action='store_true',
+                             help='draw the density of the features and its change points (not with --chunk-size)')
+    plot_parser.set_defaults(records=plot_records)
+
+    analytics_parser = subparsers.add_parser('analytics', help='positions where the growth of wortverbund changes')
+    add_selection(analytics_parser)
+    analytics_parser.add_argument('--start', help='start position, e.g. "6/1"')
+    analytics_parser.add_argument('--end', help='end position, e.g. "50/40"')
+    analytics_parser.add_argument('--bins', type=int, default=200,
+                                  help='number of bins the features are counted in (default: %(default)s)')
+    analytics_parser.add_argument('--penalty', type=float,
+                                  help='minimal gain of a change point (default: logarithm of the number of features)')
+    analytics_parser.add_argument('--max-change-points', type=int, default=10,
+                                  help='maximal number of change points per wortverbund (default: %(default)s)')
+    analytics_parser.set_defaults(records=analytics_records)
+
+    check_parser = subparsers.add_parser('check', help='check wortverbund files for unreadable rows')
+    check_parser.add_argument('projects', nargs='*',
+                              help='projects to check (default: all)')
+    check_parser.add_argument('--repair', action='store_true',
+                              help='repair the files with errors (removing lines that can\'t be repaired)')
+    check_parser.add_argument('--workers', type=int,
+                              help='number of processes (default: number of CPUs)')
+    check_parser.set_defaults(records=check_records)
+
+    pack_parser = subparsers.add_parser('pack', help='pack a project into a single bundle file')
+    pack_parser.add_argument('project')
+    pack_parser.add_argument('output', help='bundle file, e.g. "project.wbb"')
+    pack_parser.add_argument('--compression', choices=('zstd', 'gzip'),
+                             help='compression of the members (default: zstd if available, else gzip)')
+    pack_parser.add_argument('--x-values', action='store_true',
+                             help='pack the sorted features with their x-values as well')
+    pack_parser.set_defaults(records=pack_records)
+
+    unpack_parser = subparsers.add_parser('unpack', help='unpack a bundle file into a new project')
+    unpack_parser.add_argument('bundle')
+    unpack_parser.add_argument('--project',
+                               help='name of the new project (default: the packed project\'s name)')
+    unpack_parser.set_defaults(records=unpack_records)
+
+    history_parser = subparsers.add_parser('history', help='recorded changes of a wortverbund')
+    history_parser.add_argument('project')
+    history_parser.add_argument('wortverbund')
+    history_parser.add_argument('--at', help='show the wortverbund as it was at this time, e.g. "2019-03-01T12:00"')
+    history_parser.add_argument('--since', help='show the changes since this time (up to "--at")')
+    history_parser.set_defaults(records=history_records)
+
+    convert_parser = subparsers.add_parser('convert', help='convert wortverbund into sign_compare files')
+    add_selection(convert_parser)
+    convert_parser.add_argument('--sc-directory', default='sc_files',
+                                help='directory of the sign_compare files (default: %(default)s)')
+    convert_parser.add_argument('--mode', choices=('append', 'replace', 'sync'),
+                                default='replace',
+                                help='how to treat existing sign_compare files (default: %(default)s)')
+    convert_parser.set_defaults(records=convert_records)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        write_records(args.records(args), args.format)
+    except BrokenPipeError:
+        return 0
+    except (OSError, ValueError) as error:
+        sys.stderr.write('wortverbund_builder: '+str(error)+'\n')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
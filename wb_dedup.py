@@ -0,0 +1,194 @@
+# wb_dedup.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Finds near-duplicate features (e.g. "Freundin von Fr. Nimptsch" and
+    "Nachbarin von Fr. Nimptsch") in a wortverbund or a whole project.
+
+    The features are split into character shingles; the shingle sets are
+    reduced to MinHash signatures, which are bucketed by locality sensitive
+    hashing (LSH). Only features sharing a bucket are compared, so the
+    detection scales roughly linearly with the number of features instead of
+    quadratically."""
+
+import os
+import random
+import zlib
+
+import wb_func
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(feature, size=3):
+    """Returns the set of character shingles (of length "size") of a feature
+        (ignoring case and surrounding or repeated whitespace)."""
+    text = ' '+' '.join(feature.lower().split())+' '
+    if len(text) <= size:
+        return {text}
+    return {text[i:i+size] for i in range(len(text)-size+1)}
+
+
+def jaccard(shingles_0, shingles_1):
+    if not shingles_0 and not shingles_1:
+        return 1.0
+    return len(shingles_0 & shingles_1)/len(shingles_0 | shingles_1)
+
+
+class MinHasher:
+    """Calculates MinHash signatures of shingle sets.
+
+    Args:
+        num_perm: number of hash functions (length of a signature).
+        seed: seed of the hash functions (signatures are only comparable if
+            they were calculated with the same seed)."""
+
+    def __init__(self, num_perm=64, seed=1):
+        generator = random.Random(seed)
+        self.permutations = [(generator.randrange(1, _PRIME),
+                              generator.randrange(0, _PRIME))
+                             for _ in range(num_perm)]
+
+    def signature(self, shingle_set):
+        hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set]
+        return tuple(min(((a*h+b) % _PRIME) & _MAX_HASH for h in hashes)
+                     for a, b in self.permutations)
+
+
+def lsh_bands(threshold, num_perm=64, recall=0.99):
+    """Returns the largest number of rows per LSH band (and so the fewest
+        candidates) for which two features with a Jaccard similarity of
+        "threshold" still share a bucket with a probability of at least
+        "recall".
+
+    Returns "(bands, rows)" ("bands*rows" being "num_perm")."""
+    for rows in range(num_perm, 0, -1):
+        if num_perm % rows:
+            continue
+        bands = num_perm//rows
+        if 1-(1-threshold**rows)**bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+
+def find_near_duplicates(features, threshold=0.5, num_perm=64, bands=None,
+                         shingle_size=3):
+    """Finds clusters of near-duplicate features.
+
+    Args:
+        features: list of "(feature, position, wortverbund)" tuples (the
+            position and the wortverbund are only passed through to the
+            result).
+        threshold: minimal Jaccard similarity of the shingle sets of two
+            features to regard them as near-duplicates.
+        num_perm: number of hash functions of the MinHash signatures.
+        bands: number of LSH bands ("num_perm" has to be divisible by it);
+            more bands find more candidates (with lower similarities). If
+            None, it is derived from "threshold" (see "lsh_bands").
+        shingle_size: length of the character shingles.
+
+    Returns a list of clusters (largest first); every cluster is a list of
+        the "(feature, position, wortverbund)" tuples belonging to it."""
+    if bands is None:
+        bands, rows = lsh_bands(threshold, num_perm)
+    elif num_perm % bands:
+        raise ValueError('"num_perm" has to be divisible by "bands"')
+    else:
+        rows = num_perm//bands
+
+    # Identical features (ignoring case and whitespace) are grouped first, so
+    # only unique texts are hashed and compared.
+    occurrences = {}
+    for feature in features:
+        key = ' '.join(feature[0].lower().split())
+        occurrences.setdefault(key, []).append(feature)
+    texts = list(occurrences)
+    shingle_sets = [shingles(text, shingle_size) for text in texts]
+
+    minhasher = MinHasher(num_perm)
+    buckets = {}
+    for i, shingle_set in enumerate(shingle_sets):
+        signature = minhasher.signature(shingle_set)
+        for band in range(bands):
+            buckets.setdefault((band, signature[band*rows:(band+1)*rows]),
+                               []).append(i)
+
+    # Verifies the candidate pairs and joins them (union-find).
+    parents = list(range(len(texts)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    compared = set()
+    for bucket in buckets.values():
+        for j in range(1, len(bucket)):
+            for k in range(j):
+                pair = (bucket[k], bucket[j])
+                if pair in compared or find(pair[0]) == find(pair[1]):
+                    continue
+                compared.add(pair)
+                if jaccard(shingle_sets[pair[0]], shingle_sets[pair[1]]) >= threshold:
+                    parents[find(pair[0])] = find(pair[1])
+
+    clusters = {}
+    for i, text in enumerate(texts):
+        clusters.setdefault(find(i), []).extend(occurrences[text])
+    clusters = [cluster for cluster in clusters.values() if len(cluster) > 1]
+    clusters.sort(key=len, reverse=True)
+    return clusters
+
+
+def _features_of_file(path, wortverbund):
+    features = []
+    for feature, position in wb_func.read_wortverbund(path):
+        features.append((feature, '/'.join(str(value) for value in position),
+                         wortverbund))
+    return features
+
+
+def wortverbund_near_duplicates(project, wortverbund, wb_directory='wb_files',
+                                **kwargs):
+    """Finds near-duplicate features within a single wortverbund (see
+        "find_near_duplicates" for the keyword arguments)."""
+    return find_near_duplicates(
+        _features_of_file(wb_directory+'/'+project+'/'+wortverbund+'.csv',
+                          wortverbund), **kwargs)
+
+
+def project_near_duplicates(project, wb_directory='wb_files', across=False,
+                            **kwargs):
+    """Finds near-duplicate features within every wortverbund of a project
+        (see "find_near_duplicates" for the keyword arguments).
+
+    Only duplicates within a wortverbund inflate its curve, so a cluster
+    belongs to a single wortverbund unless "across" is True (then features of
+    different wortverbund are clustered together as well)."""
+    features = []
+    clusters = []
+    for wortverbund_file in sorted(os.listdir(wb_directory+'/'+project)):
+        wortverbund_features = _features_of_file(wb_directory+'/'+project+'/'+wortverbund_file,
+                                                 wortverbund_file[:-4])
+        if across:
+            features.extend(wortverbund_features)
+        else:
+            clusters.extend(find_near_duplicates(wortverbund_features, **kwargs))
+    if across:
+        return find_near_duplicates(features, **kwargs)
+    clusters.sort(key=len, reverse=True)
+    return clusters
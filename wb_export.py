@@ -0,0 +1,323 @@
+# wb_export.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Exports whole projects (or all projects) as one columnar dataset and loads
+    such datasets again.
+
+    Every row of a dataset is a feature with its project, its wortverbund, its
+    raw position values and its x-value (as calculated by
+    "wb_func.calculate_position_values"). Three formats are supported:
+        - "parquet": Parquet file (needs pyarrow),
+        - "arrow": Arrow IPC stream (needs pyarrow; can be memory-mapped),
+        - "npz": uncompressed NumPy archive (needs only NumPy; the columns are
+          memory-mapped when loading).
+    The export works file by file, so only a single wortverbund (and the
+    dictionary of the features) is held in memory at a time."""
+
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+import wb_func
+
+FORMATS = ('parquet', 'arrow', 'npz')
+
+
+def iter_wortverbund(projects=None, wb_directory='wb_files'):
+    """Yields "(project, wortverbund, content_list, x_values)" for every
+        wortverbund of the given projects (all projects if "projects" is
+        None), one file at a time; the "content_list" is sorted."""
+    if projects is None:
+        projects = sorted(project for project in os.listdir(wb_directory)
+                          if not '.' in project)
+    for project in projects:
+        for wortverbund_file in sorted(os.listdir(wb_directory+'/'+project)):
+            content_list = wb_func.read_wortverbund(wb_directory+'/'+project+'/'+wortverbund_file)
+            content_list, _, _, x_values = wb_func.prepare_wortverbund(content_list)
+            yield project, wortverbund_file[:-4], content_list, x_values
+
+
+def export_projects(path, projects=None, wb_directory='wb_files',
+                    format=None):
+    """Exports projects as one columnar dataset.
+
+    Args:
+        path: path of the dataset file.
+        projects: list of names of the projects to export; all projects are
+            exported if None.
+        wb_directory: directory of the projects.
+        format: one of "FORMATS"; guessed from the extension of "path" if
+            None ("npz" if it cannot be guessed).
+
+    Returns the number of exported features."""
+    if format is None:
+        format = os.path.splitext(path)[1][1:].lower()
+        if format not in FORMATS:
+            format = 'npz'
+    if format not in FORMATS:
+        raise ValueError('Unknown format "'+str(format)+'"')
+    if format != 'npz' and pa is None:
+        raise ImportError('pyarrow is needed to export to "'+format+'"')
+
+    writer = _NpzWriter(path) if format == 'npz' else _ArrowWriter(path, format)
+    number_of_features = 0
+    try:
+        for project, wortverbund, content_list, x_values in iter_wortverbund(projects, wb_directory):
+            writer.write(project, wortverbund, content_list, x_values)
+            number_of_features += len(content_list)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return number_of_features
+
+
+def load_dataset(path):
+    """Loads a dataset written by "export_projects" without copying its
+        columns (as far as the format allows).
+
+    Returns a "pyarrow.Table" for Parquet and Arrow files and an "NpzDataset"
+        for NPZ files."""
+    if zipfile.is_zipfile(path):
+        return NpzDataset(path)
+    if pa is None:
+        raise ImportError('pyarrow is needed to load "'+path+'"')
+    with open(path, 'rb') as dataset_file:
+        magic = dataset_file.read(4)
+    if magic == b'PAR1':
+        return pq.read_table(path, memory_map=True)
+    return pa.ipc.open_stream(pa.memory_map(path, 'r')).read_all()
+
+
+class _ArrowWriter:
+
+    def __init__(self, path, format):
+        self.path = path
+        self.format = format
+        self.schema = pa.schema([
+            ('project', pa.dictionary(pa.int32(), pa.string())),
+            ('wortverbund', pa.dictionary(pa.int32(), pa.string())),
+            ('feature', pa.dictionary(pa.int32(), pa.string())),
+            ('position', pa.list_(pa.int64())),
+            ('x_value', pa.float64())])
+        if format == 'parquet':
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.sink = pa.OSFile(path, 'wb')
+            self.writer = pa.ipc.new_stream(self.sink, self.schema)
+
+    def write(self, project, wortverbund, content_list, x_values):
+        if not content_list:
+            return
+        size = len(content_list)
+        zeros = pa.array(np.zeros(size, dtype=np.int32))
+        batch = pa.record_batch([
+            pa.DictionaryArray.from_arrays(zeros, pa.array([project])),
+            pa.DictionaryArray.from_arrays(zeros, pa.array([wortverbund])),
+            pa.array([row[0] for row in content_list]).dictionary_encode(),
+            pa.array([row[1] for row in content_list], type=pa.list_(pa.int64())),
+            pa.array(x_values, type=pa.float64())], schema=self.schema)
+        self.writer.write_batch(batch)
+
+    def close(self):
+        self.writer.close()
+        if self.format == 'arrow':
+            self.sink.close()
+
+    def abort(self):
+        try:
+            self.close()
+        finally:
+            os.remove(self.path)
+
+
+class _StringTable:
+    """Dictionary encoding strings as consecutive integer codes."""
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, string):
+        return self.codes.setdefault(string, len(self.codes))
+
+    def to_arrays(self):
+        blobs = [string.encode('utf-8') for string in self.codes]
+        offsets = np.zeros(len(blobs)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(blob) for blob in blobs])
+        return np.frombuffer(b''.join(blobs), dtype=np.uint8), offsets
+
+
+class _NpzWriter:
+    # Spools every column into a temporary file and only assembles the
+    # (uncompressed) archive in "close", copying the spooled data in chunks.
+
+    COLUMNS = (('project', np.int32), ('wortverbund', np.int32),
+               ('feature', np.int32), ('position_offsets', np.int64),
+               ('position_values', np.int64), ('x_value', np.float64))
+
+    def __init__(self, path):
+        self.path = path
+        self.spools = {name: tempfile.TemporaryFile() for name, _ in self.COLUMNS}
+        self.lengths = {name: 0 for name, _ in self.COLUMNS}
+        self.projects = _StringTable()
+        self.wortverbund = _StringTable()
+        self.wortverbund_project = []
+        self.features = _StringTable()
+        self.number_of_position_values = 0
+        self._append('position_offsets', np.zeros(1, dtype=np.int64))
+
+    def _append(self, name, array):
+        self.spools[name].write(np.ascontiguousarray(array).tobytes())
+        self.lengths[name] += len(array)
+
+    def write(self, project, wortverbund, content_list, x_values):
+        project_code = self.projects.encode(project)
+        wortverbund_code = self.wortverbund.encode(project+'/'+wortverbund)
+        if wortverbund_code == len(self.wortverbund_project):
+            self.wortverbund_project.append(project_code)
+        size = len(content_list)
+        self._append('project', np.full(size, project_code, dtype=np.int32))
+        self._append('wortverbund', np.full(size, wortverbund_code, dtype=np.int32))
+        self._append('feature', np.array([self.features.encode(row[0]) for row in content_list],
+                                         dtype=np.int32))
+        lengths = np.array([len(row[1]) for row in content_list], dtype=np.int64)
+        self._append('position_offsets',
+                     self.number_of_position_values+np.cumsum(lengths))
+        self.number_of_position_values += int(lengths.sum())
+        self._append('position_values',
+                     np.array([value for row in content_list for value in row[1]],
+                              dtype=np.int64))
+        self._append('x_value', np.array(x_values, dtype=np.float64))
+
+    def close(self):
+        with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for name, dtype in self.COLUMNS:
+                spool = self.spools[name]
+                spool.seek(0)
+                self._write_member(archive, name, np.dtype(dtype),
+                                   self.lengths[name], spool)
+                spool.close()
+            tables = {'project_names': self.projects,
+                      'wortverbund_names': self.wortverbund,
+                      'feature_names': self.features}
+            for name, table in tables.items():
+                blob, offsets = table.to_arrays()
+                self._write_array(archive, name+'_blob', blob)
+                self._write_array(archive, name+'_offsets', offsets)
+            self._write_array(archive, 'wortverbund_project',
+                              np.array(self.wortverbund_project, dtype=np.int32))
+
+    def abort(self):
+        for spool in self.spools.values():
+            spool.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def _write_member(archive, name, dtype, length, source):
+        with archive.open(name+'.npy', 'w', force_zip64=True) as member:
+            np.lib.format.write_array_header_2_0(
+                member, {'descr': np.lib.format.dtype_to_descr(dtype),
+                         'fortran_order': False, 'shape': (length,)})
+            shutil.copyfileobj(source, member, 1 << 20)
+
+    @staticmethod
+    def _write_array(archive, name, array):
+        with archive.open(name+'.npy', 'w', force_zip64=True) as member:
+            np.lib.format.write_array(member, array)
+
+
+class NpzDataset:
+    """A dataset exported as NPZ file; its arrays are memory-mapped.
+
+    Attributes:
+        project, wortverbund, feature: int32 codes of every row (see
+            "project_names", "wortverbund_names" and "feature_names").
+        position_offsets, position_values: the position values of row "i"
+            are "position_values[position_offsets[i]:position_offsets[i+1]]".
+        x_value: x-value of every row.
+        wortverbund_project: project code of every wortverbund code."""
+
+    def __init__(self, path):
+        self.path = path
+        self.arrays = {}
+        with zipfile.ZipFile(path) as archive, open(path, 'rb') as raw_file:
+            for info in archive.infolist():
+                name = info.filename[:-4]
+                if info.compress_type != zipfile.ZIP_STORED:
+                    with archive.open(info) as member:
+                        self.arrays[name] = np.lib.format.read_array(member)
+                    continue
+                # Finds the start of the member's data (behind its local
+                # header) and maps the array directly from the file.
+                raw_file.seek(info.header_offset+26)
+                name_length = int.from_bytes(raw_file.read(2), 'little')
+                extra_length = int.from_bytes(raw_file.read(2), 'little')
+                raw_file.seek(info.header_offset+30+name_length+extra_length)
+                version = np.lib.format.read_magic(raw_file)
+                if version == (1, 0):
+                    shape, _, dtype = np.lib.format.read_array_header_1_0(raw_file)
+                else:
+                    shape, _, dtype = np.lib.format.read_array_header_2_0(raw_file)
+                if shape[0] == 0:
+                    self.arrays[name] = np.zeros(shape, dtype=dtype)
+                else:
+                    self.arrays[name] = np.memmap(path, dtype=dtype, mode='r',
+                                                  offset=raw_file.tell(),
+                                                  shape=shape)
+        self._string_tables = {}
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['arrays'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.arrays['x_value'])
+
+    def strings(self, table):
+        """Returns the list of strings of a table ("project_names",
+            "wortverbund_names" or "feature_names")."""
+        if table not in self._string_tables:
+            blob = self.arrays[table+'_blob'].tobytes()
+            offsets = self.arrays[table+'_offsets']
+            self._string_tables[table] = [blob[offsets[i]:offsets[i+1]].decode('utf-8')
+                                          for i in range(len(offsets)-1)]
+        return self._string_tables[table]
+
+    def position(self, i):
+        return self.position_values[self.position_offsets[i]:self.position_offsets[i+1]]
+
+    def rows(self):
+        """Yields "(project, wortverbund, feature, position, x-value)" for
+            every row."""
+        project_names = self.strings('project_names')
+        wortverbund_names = self.strings('wortverbund_names')
+        feature_names = self.strings('feature_names')
+        for i in range(len(self)):
+            yield (project_names[self.project[i]],
+                   wortverbund_names[self.wortverbund[i]].split('/', 1)[1],
+                   feature_names[self.feature[i]], self.position(i).tolist(),
+                   float(self.x_value[i]))
@@ -0,0 +1,230 @@
+# wb_extsort.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sorts, encodes, queries and plots wortverbund files that are too large to
+    be held in memory (as "content_list").
+
+    The file is read in chunks, every chunk is sorted and written into a
+    temporary run; the runs are merged with "heapq.merge" into one sorted
+    file while the extremes are calculated in the same pass. The x-values are
+    then calculated chunk by chunk while streaming through the sorted file.
+    The results equal those of "wb_func.mergesort", "wb_func.find_extremes"
+    and "wb_func.calculate_position_values"."""
+
+import csv
+import heapq
+import itertools
+import math
+import os
+import tempfile
+
+import wb_func
+
+
+def _position_key(row):
+    return row[1]
+
+
+def _read_rows(path):
+    with open(path, 'r', newline='') as csv_file:
+        for row in csv.reader(csv_file, delimiter=';'):
+            if row:
+                yield [row[0], [int(value) for value in row[1].split('/')]]
+
+
+def _write_rows(csv_file, rows):
+    writer = csv.writer(csv_file, delimiter=';', lineterminator='\n')
+    for row in rows:
+        writer.writerow([row[0], wb_func.format_position(row[1])])
+
+
+class StreamingExtremes:
+    """Calculates the extremes of the position columns (like
+        "wb_func.find_extremes") from positions passed one by one in sorted
+        order."""
+
+    def __init__(self):
+        self.smallest_values = []
+        self.highest_values = []
+        self.closed = []
+        self.min_length = None
+
+    def add(self, position):
+        length = len(position)
+        while len(self.smallest_values) < length:
+            self.smallest_values.append(9999999)
+            self.highest_values.append(0)
+            # A column that starts behind a shorter position is closed right
+            # away (see "result").
+            self.closed.append(self.min_length is not None
+                               and self.min_length <= len(self.closed))
+        if self.min_length is None or length < self.min_length:
+            self.min_length = length
+        for i in range(1, len(self.closed)):
+            if self.closed[i]:
+                continue
+            if i >= length:
+                self.closed[i] = True
+                continue
+            if self.smallest_values[i] > position[i]:
+                self.smallest_values[i] = position[i]
+            if self.highest_values[i] < position[i]:
+                self.highest_values[i] = position[i]
+
+    def result(self):
+        """Returns "smallest_values" and "highest_values".
+
+        "find_extremes" goes through the columns one after another and stops
+        at the first position lacking a column; so the column behind the
+        shortest position is only calculated up to that position and the
+        following columns are not calculated at all."""
+        smallest_values = list(self.smallest_values)
+        highest_values = list(self.highest_values)
+        if self.min_length is not None:
+            for i in range(self.min_length+1, len(smallest_values)):
+                smallest_values[i] = 9999999
+                highest_values[i] = 0
+        return smallest_values, highest_values
+
+
+class ExternalWortverbund:
+    """A wortverbund file sorted and encoded with bounded memory.
+
+    Args:
+        path: path of the wortverbund file.
+        chunk_size: maximal number of features held in memory at a time.
+        temp_directory: directory for the temporary files (the system's
+            default if None).
+
+    Use it as context manager (or call "close") to remove the temporary
+    files."""
+
+    def __init__(self, path, chunk_size=100000, temp_directory=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.temp_directory = temp_directory
+        self.sorted_path = None
+        self.size = 0
+        self._sort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.sorted_path is not None and os.path.exists(self.sorted_path):
+            os.remove(self.sorted_path)
+        self.sorted_path = None
+
+    def _temp_file(self):
+        file_descriptor, temp_path = tempfile.mkstemp(suffix='.csv',
+                                                      dir=self.temp_directory)
+        return os.fdopen(file_descriptor, 'w', newline=''), temp_path
+
+    def _sort(self):
+        run_paths = []
+        try:
+            # Writes sorted runs of at most "chunk_size" features.
+            rows = _read_rows(self.path)
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                chunk.sort(key=_position_key) # stable, like "wb_func.mergesort"
+                run_file, run_path = self._temp_file()
+                run_paths.append(run_path)
+                with run_file:
+                    _write_rows(run_file, chunk)
+            # Merges the runs (on equal positions the earlier run comes first,
+            # so the merge is stable as well) and calculates the extremes.
+            extremes = StreamingExtremes()
+
+            def counted(rows):
+                for row in rows:
+                    extremes.add(row[1])
+                    self.size += 1
+                    yield row
+
+            sorted_file, self.sorted_path = self._temp_file()
+            with sorted_file:
+                _write_rows(sorted_file,
+                            counted(heapq.merge(*[_read_rows(run_path) for run_path in run_paths],
+                                                key=_position_key)))
+            self.smallest_values, self.highest_values = extremes.result()
+        finally:
+            for run_path in run_paths:
+                os.remove(run_path)
+
+    def iter_features(self):
+        """Yields "(feature, position, x-value)" for every feature in sorted
+            order, calculating the x-values chunk by chunk."""
+        rows = _read_rows(self.sorted_path)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            x_values = wb_func.calculate_position_values(chunk,
+                                                         self.smallest_values,
+                                                         self.highest_values)
+            for row, x_value in zip(chunk, x_values):
+                yield row[0], row[1], x_value
+
+    def _limits(self, start, end):
+        if start is None:
+            start = 0
+        elif isinstance(start, str):
+            start = wb_func.encode_position(start, self.smallest_values,
+                                            self.highest_values)
+        if end is None:
+            end = math.inf
+        elif isinstance(end, str):
+            end = wb_func.encode_position(end, self.smallest_values,
+                                          self.highest_values)
+        if start > end:
+            start, end = end, start
+        return start, end
+
+    def query(self, start=None, end=None):
+        """Yields "(number, feature, position, x-value)" for every feature
+            within a range (see "wb_func.features_in_range"); "number" is the
+            number of the feature in the sorted wortverbund (starting at 1)."""
+        start, end = self._limits(start, end)
+        for number, (feature, position, x_value) in enumerate(self.iter_features(), 1):
+            if x_value > end:
+                break # the x-values grow with the sorted positions
+            if start <= x_value:
+                yield number, feature, position, x_value
+
+    def plot_points(self, start=None, end=None, max_points=10000):
+        """Returns the x-values and the numbers of the features within a range
+            thinned out to at most about "max_points" points (keeping the
+            last one), so large wortverbund can be plotted with bounded
+            memory."""
+        stride = max(1, math.ceil(self.size/max_points))
+        positions = []
+        numbers = []
+        last = None
+        for number, _, _, x_value in self.query(start, end):
+            if (number-1) % stride == 0:
+                positions.append(x_value)
+                numbers.append(number)
+            last = (x_value, number)
+        if last is not None and (not numbers or numbers[-1] != last[1]):
+            positions.append(last[0])
+            numbers.append(last[1])
+        return positions, numbers
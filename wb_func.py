@@ -17,6 +17,103 @@
 """Miscellaneous functions needed for "wortverbund_builder.py" to work as
     intended."""
 
+import csv
+
+
+def read_wortverbund(path):
+    """Reads the features of a wortverbund file and their positions.
+
+    Args:
+        path: path of the csv-file of a wortverbund.
+
+    Returns the "content_list" of the wortverbund, i.e. a list of
+        [feature, [position values]] (the position values being integers)."""
+    with open(path, 'r') as csv_file:
+        content_list = []
+        for row in csv.reader(csv_file, delimiter=';'):
+            row[1] = row[1].split('/')
+            for i in range(len(row[1])):
+                row[1][i] = int(row[1][i])
+            content_list.append(row)
+    return content_list
+
+
+def prepare_wortverbund(content_list):
+    """Sorts a "content_list" and calculates everything needed to show or plot
+        it.
+
+    Args:
+        content_list: list with features of a wortverbund and their positions of
+            occurrence.
+
+    Returns:
+        content_list: the sorted "content_list".
+        smallest_values: see "find_extremes".
+        highest_values: see "find_extremes".
+        x_values: see "calculate_position_values"."""
+    content_list = mergesort(content_list, len(content_list))
+    smallest_values, highest_values = find_extremes(content_list)
+    x_values = calculate_position_values(content_list, smallest_values,
+                                         highest_values)
+    return content_list, smallest_values, highest_values, x_values
+
+
+def encode_position(position, smallest_values, highest_values):
+    """Calculates the x-value of a single position entered as a string (e.g.
+        "134/12") in the same way as the x-values of a wortverbund.
+
+    Args:
+        position: the position as string (values separated by "/") or as a
+            number.
+        smallest_values: see "calculate_position_values".
+        highest_values: see "calculate_position_values".
+
+    Returns the x-value of the position."""
+    if isinstance(position, (int, float)):
+        position = [position]
+    else:
+        position = [int(value) for value in position.split('/')]
+    return calculate_position_values([[None, position]], smallest_values,
+                                     highest_values)[0]
+
+
+def format_position(position):
+    """Returns a position (list of values) as string, e.g. "134/12"."""
+    return '/'.join(str(value) for value in position)
+
+
+def features_in_range(content_list, x_values, start=None, end=None,
+                      smallest_values=None, highest_values=None):
+    """Yields the indices of the features of a sorted "content_list" within a
+        range (like "WortverbundShow.show_list" does).
+
+    Args:
+        content_list: sorted list with features of a wortverbund and their
+            positions of occurrence.
+        x_values: x-values of the "content_list".
+        start: start of the range as x-value or as position string (e.g.
+            "6/1"); the range starts at 0 if None.
+        end: end of the range as x-value or as position string; the range
+            ends behind the last feature if None.
+        smallest_values, highest_values: extremes of the "content_list"
+            (needed to encode position strings, see "find_extremes")."""
+    if not x_values:
+        return
+    if start is None:
+        start = 0
+    elif isinstance(start, str):
+        start = encode_position(start, smallest_values, highest_values)
+    if end is None:
+        end = x_values[-1]+1
+    elif isinstance(end, str):
+        end = encode_position(end, smallest_values, highest_values)
+    if start > end:
+        start, end = end, start
+    for i in range(len(x_values)):
+        if x_values[i] >= start and x_values[i] <= end:
+            yield i
+
+
 def mergesort(content_list, size):
     """Sorts the features and their positions in respect to the latter.
 
@@ -0,0 +1,275 @@
+# wb_journal.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keeps the history of every wortverbund file, so earlier states can be
+    restored and compared.
+
+    Every change made through "wb_lock.py" is recorded in a journal of the
+    wortverbund (in "wb_files/.journal/<project>/<wortverbund>"):
+        - "log.jsonl": one line per operation with its time: "add" (a line
+          appended or inserted at "at"), "remove" (the line at "at") or
+          "clear" (the wortverbund was deleted),
+        - "<number>.csv.gz": checkpoints, i.e. the compressed content of the
+          file after "<number>" operations,
+        - "checkpoints.jsonl": number, time and log offset of every
+          checkpoint,
+        - "count.json": the number of operations and the size of the log, so
+          recording doesn't have to count the operations in the log again.
+    A past state is reconstructed by loading the last checkpoint before the
+    requested time and replaying the operations behind it. A checkpoint is
+    written after "CHECKPOINT_INTERVAL" operations, but never after fewer
+    operations than the file has lines, so the checkpoints stay about as small
+    as the log and no reconstruction replays more operations than that.
+
+    The journals are kept when a wortverbund or project is deleted."""
+
+import bisect
+import collections
+import datetime
+import gzip
+import json
+import os
+import time
+
+JOURNAL_DIRECTORY = '.journal'
+CHECKPOINT_INTERVAL = 100
+
+
+def journal_directory(project, wortverbund, wb_directory='wb_files'):
+    return wb_directory+'/'+JOURNAL_DIRECTORY+'/'+project+'/'+wortverbund
+
+
+def _timestamp(moment):
+    # Accepts times as "datetime" or as seconds since the epoch.
+    if moment is None:
+        return None
+    if isinstance(moment, datetime.datetime):
+        return moment.timestamp()
+    return float(moment)
+
+
+def _read_lines(path):
+    try:
+        with open(path, 'r', errors='replace') as wortverbund_file:
+            return wortverbund_file.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+
+def _read_checkpoints(directory):
+    checkpoints = []
+    try:
+        with open(directory+'/checkpoints.jsonl', 'r') as checkpoints_file:
+            for line in checkpoints_file:
+                checkpoints.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return checkpoints
+
+
+def _write_checkpoint(directory, number, moment, lines):
+    checkpoint_path = directory+'/'+str(number)+'.csv.gz'
+    with gzip.open(checkpoint_path+'.tmp', 'wt') as checkpoint_file:
+        checkpoint_file.write(''.join(line+'\n' for line in lines))
+    os.replace(checkpoint_path+'.tmp', checkpoint_path)
+    try:
+        offset = os.path.getsize(directory+'/log.jsonl')
+    except FileNotFoundError:
+        offset = 0
+    with open(directory+'/checkpoints.jsonl', 'a') as checkpoints_file:
+        checkpoints_file.write(json.dumps({'number': number, 'time': moment,
+                                           'offset': offset,
+                                           'lines': len(lines)})+'\n')
+
+
+def _load_checkpoint(directory, checkpoint):
+    with gzip.open(directory+'/'+str(checkpoint['number'])+'.csv.gz', 'rt') as checkpoint_file:
+        return checkpoint_file.read().splitlines()
+
+
+def _operation_count(directory, last):
+    # Returns the number of operations in the log; they are only counted
+    # again (from the last checkpoint "last" on) if "count.json" doesn't
+    # match the log (e.g. after a crash between writing the two).
+    try:
+        size = os.path.getsize(directory+'/log.jsonl')
+    except FileNotFoundError:
+        return last['number']
+    try:
+        with open(directory+'/count.json', 'r') as count_file:
+            count = json.load(count_file)
+        if count['size'] == size:
+            return count['operations']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    with open(directory+'/log.jsonl', 'rb') as log_file:
+        log_file.seek(last['offset'])
+        return last['number']+sum(1 for _ in log_file)
+
+
+def begin(project, wortverbund, wb_directory='wb_files'):
+    """Starts the journal of a wortverbund (if there is none yet) with a
+        checkpoint of the current file; to be called (holding the lock of
+        the wortverbund) before changing the file."""
+    directory = journal_directory(project, wortverbund, wb_directory)
+    if os.path.exists(directory+'/checkpoints.jsonl'):
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = wb_directory+'/'+project+'/'+wortverbund+'.csv'
+    try:
+        moment = os.path.getmtime(path)
+    except FileNotFoundError:
+        moment = time.time()
+    _write_checkpoint(directory, 0, moment, _read_lines(path))
+
+
+def record(project, wortverbund, operations, wb_directory='wb_files'):
+    """Appends operations (dictionaries with "op", "line" and "at", see
+        above) to the journal of a wortverbund and writes a checkpoint if
+        it is due; to be called holding the lock of the wortverbund after
+        changing the file."""
+    if not operations:
+        return
+    begin(project, wortverbund, wb_directory)
+    directory = journal_directory(project, wortverbund, wb_directory)
+    moment = time.time()
+    last = _read_checkpoints(directory)[-1]
+    operation_count = _operation_count(directory, last)+len(operations)
+    with open(directory+'/log.jsonl', 'a') as log_file:
+        for operation in operations:
+            log_file.write(json.dumps(dict(operation, time=moment), ensure_ascii=False)+'\n')
+    with open(directory+'/count.json', 'w') as count_file:
+        json.dump({'operations': operation_count,
+                   'size': os.path.getsize(directory+'/log.jsonl')}, count_file)
+    if operation_count-last['number'] >= max(CHECKPOINT_INTERVAL, last['lines']):
+        lines = _replay(_load_checkpoint(directory, last), directory,
+                        last['offset'])
+        _write_checkpoint(directory, operation_count, moment, lines)
+
+
+def record_append(project, wortverbund, text, wb_directory='wb_files'):
+    """Records the lines of "text" appended to a wortverbund file."""
+    record(project, wortverbund,
+           [{'op': 'add', 'line': line} for line in text.splitlines() if line],
+           wb_directory)
+
+
+def record_rewrite(project, wortverbund, old_text, new_text,
+                   wb_directory='wb_files'):
+    """Records the replacement of the content "old_text" of a wortverbund file
+        by "new_text" (as removed and added lines between their common
+        beginning and end)."""
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+    prefix = 0
+    while (prefix < len(old_lines) and prefix < len(new_lines)
+           and old_lines[prefix] == new_lines[prefix]):
+        prefix += 1
+    suffix = 0
+    while (suffix < len(old_lines)-prefix and suffix < len(new_lines)-prefix
+           and old_lines[-1-suffix] == new_lines[-1-suffix]):
+        suffix += 1
+    operations = [{'op': 'remove', 'at': prefix, 'line': line}
+                  for line in old_lines[prefix:len(old_lines)-suffix]]
+    operations += [{'op': 'add', 'at': prefix+i, 'line': line}
+                   for i, line in enumerate(new_lines[prefix:len(new_lines)-suffix])]
+    record(project, wortverbund, operations, wb_directory)
+
+
+def record_clear(project, wortverbund, wb_directory='wb_files'):
+    """Records the deletion of a wortverbund."""
+    record(project, wortverbund, [{'op': 'clear'}], wb_directory)
+
+
+def _apply(lines, operation):
+    if operation['op'] == 'add':
+        if operation.get('at') is None:
+            lines.append(operation['line'])
+        else:
+            lines.insert(operation['at'], operation['line'])
+    elif operation['op'] == 'remove':
+        del lines[operation['at']]
+    elif operation['op'] == 'clear':
+        del lines[:]
+
+
+def _replay(lines, directory, offset, until=None):
+    # Applies the operations of the log from "offset" on (up to the time
+    # "until") to "lines".
+    try:
+        with open(directory+'/log.jsonl', 'rb') as log_file:
+            log_file.seek(offset)
+            for line in log_file:
+                operation = json.loads(line)
+                if until is not None and operation['time'] > until:
+                    break
+                _apply(lines, operation)
+    except FileNotFoundError:
+        pass
+    return lines
+
+
+def history(project, wortverbund, wb_directory='wb_files'):
+    """Yields "(number, time, operation)" for every recorded operation
+        ("number" being the number of operations applied after it)."""
+    directory = journal_directory(project, wortverbund, wb_directory)
+    try:
+        with open(directory+'/log.jsonl', 'r') as log_file:
+            for number, line in enumerate(log_file, 1):
+                operation = json.loads(line)
+                yield number, operation.pop('time'), operation
+    except FileNotFoundError:
+        return
+
+
+def reconstruct(project, wortverbund, at=None, wb_directory='wb_files'):
+    """Returns the lines ("feature;position") a wortverbund file had at a time
+        ("datetime" or seconds since the epoch; the latest state if None).
+
+    Returns None if the wortverbund was not journaled at that time yet."""
+    directory = journal_directory(project, wortverbund, wb_directory)
+    checkpoints = _read_checkpoints(directory)
+    at = _timestamp(at)
+    if at is None:
+        i = len(checkpoints)
+    else:
+        i = bisect.bisect_right([checkpoint['time'] for checkpoint in checkpoints], at)
+    if not i:
+        return None
+    checkpoint = checkpoints[i-1]
+    return _replay(_load_checkpoint(directory, checkpoint), directory,
+                   checkpoint['offset'], at)
+
+
+def diff(project, wortverbund, since, until=None, wb_directory='wb_files'):
+    """Compares the states of a wortverbund at two times (see "reconstruct").
+
+    Returns "(added, removed)": the lines added and removed in between."""
+    old_lines = reconstruct(project, wortverbund, since, wb_directory) or []
+    new_lines = reconstruct(project, wortverbund, until, wb_directory) or []
+    return _missing(new_lines, old_lines), _missing(old_lines, new_lines)
+
+
+def _missing(lines, other_lines):
+    # Returns the lines of "lines" not in "other_lines" (counting duplicates).
+    counts = collections.Counter(other_lines)
+    missing = []
+    for line in lines:
+        if counts[line]:
+            counts[line] -= 1
+        else:
+            missing.append(line)
+    return missing
@@ -0,0 +1,180 @@
+# wb_lock.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Coordinates several users working on the same "wb_files" directory.
+
+    - Advisory locks (fcntl): every wortverbund has its own lock, so writers
+      of different wortverbund never block each other. Writers also hold the
+      lock of their project in shared mode, while deleting a project takes it
+      exclusively. The lock files are kept in "wb_files/.locks".
+    - Atomic rewrites: files are rewritten by writing a temporary file (in
+      "wb_files/.tmp") and renaming it, so readers never see a torn file.
+    - Optimistic version checks: "version" returns a token of the current
+      state of a file; a rewrite expecting another version raises
+      "ConflictError" instead of overwriting the changes of someone else.
+
+    - History: every change is recorded in the journal of the wortverbund
+      while holding its lock (see "wb_journal.py").
+
+    Without fcntl (e.g. on Windows) the locks are no-ops, the atomic rewrites
+    and version checks still work."""
+
+import contextlib
+import os
+import shutil
+import stat
+import tempfile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import wb_journal
+
+
+class ConflictError(Exception):
+    """Raised if a file was changed by someone else in the meantime."""
+
+
+@contextlib.contextmanager
+def locked(path, shared=False):
+    """Holds an advisory lock on the lock file "path" (which is created if
+        necessary) while the context is active."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def project_lock(project, wb_directory='wb_files', shared=False):
+    """Locks a whole project (exclusively unless "shared" is True)."""
+    with locked(wb_directory+'/.locks/'+project+'.lock', shared):
+        yield
+
+
+@contextlib.contextmanager
+def wortverbund_lock(project, wortverbund, wb_directory='wb_files'):
+    """Locks a single wortverbund exclusively (and its project shared)."""
+    with project_lock(project, wb_directory, shared=True):
+        with locked(wb_directory+'/.locks/'+project+'/'+wortverbund+'.lock'):
+            yield
+
+
+def version(path):
+    """Returns a token identifying the current state of the file "path" (None
+        if it does not exist)."""
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+
+def atomic_write(path, text, temp_directory=None):
+    """Replaces the content of "path" with "text" by writing a temporary file
+        (in "temp_directory", which has to be on the same file system) and
+        renaming it.
+
+    Returns the version of the new file."""
+    if temp_directory is None:
+        temp_directory = os.path.dirname(path) or '.'
+    os.makedirs(temp_directory, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    file_descriptor, temp_path = tempfile.mkstemp(dir=temp_directory)
+    try:
+        os.chmod(temp_path, mode)
+        with os.fdopen(file_descriptor, 'w') as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return version(path)
+
+
+def append(project, wortverbund, text, wb_directory='wb_files'):
+    """Appends "text" to a wortverbund file (holding its lock).
+
+    Returns the versions of the file before and after appending."""
+    path = wb_directory+'/'+project+'/'+wortverbund+'.csv'
+    with wortverbund_lock(project, wortverbund, wb_directory):
+        old_version = version(path)
+        wb_journal.begin(project, wortverbund, wb_directory)
+        with open(path, 'a') as wortverbund_file:
+            wortverbund_file.write(text)
+        wb_journal.record_append(project, wortverbund, text, wb_directory)
+        return old_version, version(path)
+
+
+def rewrite(project, wortverbund, text, expected_version=None,
+            wb_directory='wb_files'):
+    """Atomically replaces the content of a wortverbund file (holding its
+        lock).
+
+    Args:
+        project: name of the project.
+        wortverbund: name of the wortverbund.
+        text: the new content.
+        expected_version: if given, "ConflictError" is raised if the file is
+            not in this version anymore.
+        wb_directory: directory of the projects.
+
+    Returns the version of the new file."""
+    path = wb_directory+'/'+project+'/'+wortverbund+'.csv'
+    with wortverbund_lock(project, wortverbund, wb_directory):
+        if expected_version is not None and version(path) != expected_version:
+            raise ConflictError(path)
+        wb_journal.begin(project, wortverbund, wb_directory)
+        try:
+            with open(path, 'r', errors='replace') as wortverbund_file:
+                old_text = wortverbund_file.read()
+        except FileNotFoundError:
+            old_text = ''
+        new_version = atomic_write(path, text, wb_directory+'/.tmp')
+        wb_journal.record_rewrite(project, wortverbund, old_text, text, wb_directory)
+        return new_version
+
+
+def remove_wortverbund(project, wortverbund, wb_directory='wb_files'):
+    with wortverbund_lock(project, wortverbund, wb_directory):
+        wb_journal.begin(project, wortverbund, wb_directory)
+        os.remove(wb_directory+'/'+project+'/'+wortverbund+'.csv')
+        wb_journal.record_clear(project, wortverbund, wb_directory)
+
+
+def remove_project(project, wb_directory='wb_files'):
+    with project_lock(project, wb_directory):
+        wortverbund_names = [wortverbund_file[:-4] for wortverbund_file in
+                             os.listdir(wb_directory+'/'+project)]
+        for wortverbund in wortverbund_names:
+            wb_journal.begin(project, wortverbund, wb_directory)
+        shutil.rmtree(wb_directory+'/'+project)
+        for wortverbund in wortverbund_names:
+            wb_journal.record_clear(project, wortverbund, wb_directory)
@@ -0,0 +1,214 @@
+# wb_render.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Draws many wortverbund into a single plot with only two artists.
+
+    All curves are drawn as one "LineCollection" and all features as one
+    "PathCollection" (scatter), coloured by a colour map. Hovering over a
+    feature shows a tooltip (feature, wortverbund and position); the feature
+    is found by a nearest neighbour lookup over the display coordinates of
+    the features that are not faded out instead of hit testing every
+    artist: in a KD-tree if SciPy is installed, otherwise in a uniform grid
+    of buckets (as wide as the hover radius) with NumPy."""
+
+import numpy as np
+import matplotlib
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+MAX_LEGEND_ENTRIES = 12 # more wortverbund are only listed in a filter window
+FADED_ALPHA = 0.12
+
+
+def _get_colormap(name):
+    try:
+        return matplotlib.colormaps[name]
+    except AttributeError: # matplotlib < 3.5
+        return matplotlib.cm.get_cmap(name)
+
+
+class Series:
+    """A single curve: the x-values and numbers of the features of a
+        wortverbund, the features and their (raw) positions."""
+
+    def __init__(self, name, x_values, numbers, features, positions):
+        self.name = name
+        self.x_values = list(x_values)
+        self.numbers = list(numbers)
+        self.features = list(features)
+        self.positions = list(positions)
+
+
+class _NearestPoints:
+    # Nearest neighbour lookup (within "radius") over two-dimensional points.
+
+    def __init__(self, points, radius):
+        self.points = points
+        self.radius = radius
+        self.tree = None
+        self.buckets = {}
+        if not len(points):
+            return
+        if cKDTree is not None:
+            self.tree = cKDTree(points)
+            return
+        # Without SciPy the points are sorted into square cells of the size of
+        # the radius, so a query only looks at the points of nine cells.
+        cells = np.floor(points/radius).astype(np.int64)
+        self.order = np.lexsort((cells[:, 1], cells[:, 0]))
+        keys, starts = np.unique(cells[self.order], axis=0, return_index=True)
+        ends = np.append(starts[1:], len(points))
+        self.buckets = {(int(key[0]), int(key[1])): (start, end)
+                        for key, start, end in zip(keys, starts, ends)}
+
+    def query(self, point, radius):
+        if not len(self.points):
+            return None
+        if self.tree is not None:
+            distance, i = self.tree.query(point, distance_upper_bound=radius)
+            return None if np.isinf(distance) else int(i)
+        cell_x = int(np.floor(point[0]/self.radius))
+        cell_y = int(np.floor(point[1]/self.radius))
+        candidates = [self.order[start:end]
+                      for key in [(cell_x+i, cell_y+j) for i in (-1, 0, 1) for j in (-1, 0, 1)]
+                      for start, end in [self.buckets.get(key, (0, 0))]]
+        candidates = np.concatenate(candidates)
+        if not len(candidates):
+            return None
+        distances = np.hypot(self.points[candidates, 0]-point[0],
+                             self.points[candidates, 1]-point[1])
+        i = int(np.argmin(distances))
+        return int(candidates[i]) if distances[i] <= radius else None
+
+
+class CombinedRenderer:
+    """Draws all "series" on "axes" as one line and one scatter artist.
+
+    Args:
+        axes: the matplotlib axes.
+        series: list of "Series".
+        colormap: name of the matplotlib colour map.
+        hover_radius: maximal distance (in pixels) of the mouse to a feature
+            to show its tooltip."""
+
+    def __init__(self, axes, series, colormap='tab20', hover_radius=8):
+        self.axes = axes
+        self.series = series
+        self.hover_radius = hover_radius
+        colormap = _get_colormap(colormap)
+        if getattr(colormap, 'N', 256) < 256:
+            self.colors = np.array([colormap(i % colormap.N) for i in range(len(series))])
+        else:
+            self.colors = np.array([colormap(i/max(1, len(series)-1)) for i in range(len(series))])
+        self.colors = self.colors.reshape(-1, 4)
+
+        self.lines = LineCollection([np.column_stack([s.x_values, s.numbers]).reshape(-1, 2)
+                                     for s in series], colors=self.colors)
+        axes.add_collection(self.lines)
+        self.point_series = np.concatenate([np.full(len(s.x_values), i, dtype=int)
+                                            for i, s in enumerate(series)] or [np.zeros(0, dtype=int)])
+        self.point_index = np.concatenate([np.arange(len(s.x_values))
+                                           for s in series] or [np.zeros(0, dtype=int)])
+        self.data_points = np.column_stack([
+            np.concatenate([s.x_values for s in series] or [[]]).astype(float),
+            np.concatenate([s.numbers for s in series] or [[]]).astype(float)]).reshape(-1, 2)
+        self.scatter = axes.scatter(self.data_points[:, 0], self.data_points[:, 1],
+                                    s=9, c=self.colors[self.point_series] if len(self.point_series) else None)
+        axes.autoscale_view()
+
+        self.highlighted = None
+        self.tooltip = axes.annotate('', (0, 0), xytext=(12, 12),
+                                     textcoords='offset points',
+                                     bbox=dict(boxstyle='round', fc='lightyellow', alpha=0.9),
+                                     zorder=10)
+        self.tooltip.set_visible(False)
+        self._index = None
+        self._callbacks = [axes.callbacks.connect('xlim_changed', self._invalidate),
+                           axes.callbacks.connect('ylim_changed', self._invalidate)]
+        canvas = axes.figure.canvas
+        self._canvas_callbacks = [canvas.mpl_connect('resize_event', self._invalidate),
+                                  canvas.mpl_connect('motion_notify_event', self._on_motion)]
+
+    def disconnect(self):
+        for callback in self._callbacks:
+            self.axes.callbacks.disconnect(callback)
+        for callback in self._canvas_callbacks:
+            self.axes.figure.canvas.mpl_disconnect(callback)
+
+    def legend(self, loc='upper left'):
+        """Draws a legend (only for up to "MAX_LEGEND_ENTRIES" wortverbund)."""
+        if 0 < len(self.series) <= MAX_LEGEND_ENTRIES:
+            handles = [Line2D([], [], color=self.colors[i], marker='.')
+                       for i in range(len(self.series))]
+            self.axes.legend(handles, [s.name for s in self.series], loc=loc)
+
+    def highlight(self, names=None):
+        """Fades all wortverbund but the ones in "names" (shows all of them
+            normally if "names" is None or empty)."""
+        self.highlighted = set(names) if names else None
+        colors = self.colors.copy()
+        if self.highlighted is not None:
+            for i, s in enumerate(self.series):
+                if s.name not in self.highlighted:
+                    colors[i, 3] = FADED_ALPHA
+        self.lines.set_colors(colors)
+        self._index = None # faded features can't be hovered
+        if len(self.point_series):
+            self.scatter.set_facecolors(colors[self.point_series])
+            self.scatter.set_edgecolors(colors[self.point_series])
+        self.axes.figure.canvas.draw_idle()
+
+    def _invalidate(self, *args):
+        self._index = None
+
+    def find(self, x, y):
+        """Returns "(series, index of the feature)" of the feature (that is
+            not faded out) next to the display coordinates "(x, y)" or
+            None."""
+        if self._index is None:
+            if self.highlighted is None:
+                self._visible = np.arange(len(self.data_points))
+            else:
+                shown = [i for i, s in enumerate(self.series) if s.name in self.highlighted]
+                self._visible = np.flatnonzero(np.isin(self.point_series, shown))
+            points = self.data_points[self._visible]
+            self._index = _NearestPoints(self.axes.transData.transform(points)
+                                         if len(points) else points,
+                                         self.hover_radius)
+        i = self._index.query((x, y), self.hover_radius)
+        if i is None:
+            return None
+        i = self._visible[i]
+        return self.series[self.point_series[i]], int(self.point_index[i])
+
+    def _on_motion(self, event):
+        found = None
+        if event.inaxes is self.axes:
+            found = self.find(event.x, event.y)
+        if found is None:
+            if self.tooltip.get_visible():
+                self.tooltip.set_visible(False)
+                self.axes.figure.canvas.draw_idle()
+            return
+        series, i = found
+        self.tooltip.xy = (series.x_values[i], series.numbers[i])
+        self.tooltip.set_text('\"'+series.features[i]+'\"\n'+series.name+'\nat '+series.positions[i])
+        self.tooltip.set_visible(True)
+        self.axes.figure.canvas.draw_idle()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+
+# wb_server.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""An optional local HTTP service (based on asyncio) answering queries about
+    the projects in a (shared) "wb_files" directory with JSON.
+
+    GET /projects
+        the names of all projects
+    GET /projects/<project>
+        the wortverbund of a project and their numbers of features
+    GET /projects/<project>/wortverbund/<wortverbund>?start=6/1&end=50/40&limit=100
+        the features of a wortverbund within a range (like "show_list")
+    GET /projects/<project>/curves?wortverbund=<name>&start=...&end=...
+        the growth curves ("[x-value, number of features]") of the selected
+        (default: all) wortverbund and their aggregated curve ("total")
+    GET /projects/<project>/plot?wortverbund=<name>&start=...&end=...
+        a rendered plot as base64-encoded PNG image
+
+    Parsed projects are kept in memory and only parsed again if one of their
+    files changed. Parsing, sorting, encoding and rendering run in an
+    executor, so many readers can be served concurrently.
+
+    Start it with "python wb_server.py --port 8080"; "serve_in_background"
+    runs it in a thread on localhost (e.g. for tests)."""
+
+import argparse
+import asyncio
+import base64
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import wb_func
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class ProjectCache:
+    """Keeps parsed projects in memory.
+
+    A project is parsed again (in the executor) when a wortverbund file was
+    added, removed or changed; the files are checked at most every
+    "check_interval" seconds."""
+
+    def __init__(self, wb_directory, executor, check_interval=1.0):
+        self.wb_directory = wb_directory
+        self.executor = executor
+        self.check_interval = check_interval
+        self.projects = {}
+        self._locks = {}
+
+    def _project_directory(self, project):
+        if '/' in project or '.' in project or not os.path.isdir(self.wb_directory+'/'+project):
+            raise HTTPError(404, 'There is no project "'+project+'".')
+        return self.wb_directory+'/'+project
+
+    def _mtimes(self, project):
+        project_directory = self._project_directory(project)
+        return {wortverbund_file[:-4]: os.stat(project_directory+'/'+wortverbund_file).st_mtime_ns
+                for wortverbund_file in os.listdir(project_directory)}
+
+    def _load(self, project, mtimes, loaded):
+        # Runs in the executor: only files that changed are parsed again.
+        wortverbund = {}
+        for name in sorted(mtimes):
+            if name in loaded and loaded[name][0] == mtimes[name]:
+                wortverbund[name] = loaded[name]
+            else:
+                content_list = wb_func.read_wortverbund(self.wb_directory+'/'+project+'/'+name+'.csv')
+                wortverbund[name] = (mtimes[name], wb_func.prepare_wortverbund(content_list))
+        return wortverbund
+
+    async def get(self, project):
+        """Returns a dictionary "wortverbund name -> (mtime, result of
+            wb_func.prepare_wortverbund)" of a project."""
+        loop = asyncio.get_running_loop()
+        entry = self.projects.get(project)
+        if entry is not None and time.monotonic()-entry['checked'] < self.check_interval:
+            return entry['wortverbund']
+        lock = self._locks.setdefault(project, asyncio.Lock())
+        async with lock:
+            entry = self.projects.get(project)
+            if entry is not None and time.monotonic()-entry['checked'] < self.check_interval:
+                return entry['wortverbund']
+            mtimes = await loop.run_in_executor(self.executor, self._mtimes, project)
+            loaded = entry['wortverbund'] if entry is not None else {}
+            if entry is None or {name: value[0] for name, value in loaded.items()} != mtimes:
+                loaded = await loop.run_in_executor(self.executor, self._load,
+                                                    project, mtimes, loaded)
+            self.projects[project] = {'checked': time.monotonic(),
+                                      'wortverbund': loaded}
+            return loaded
+
+
+def _render_plot(project, selection, start, end):
+    # Runs in the executor; uses a "Figure" directly (and not pyplot), which
+    # is safe outside of the main thread.
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    axes = figure.add_subplot()
+    axes.set_xlabel('Position of addition of a feature ('+project[-4:]+' of occurrence)')
+    axes.set_ylabel('Number of features')
+    for name, (content_list, smallest_values, highest_values, x_values) in selection:
+        indices = list(wb_func.features_in_range(content_list, x_values, start,
+                                                 end, smallest_values,
+                                                 highest_values))
+        positions = [x_values[i] for i in indices]
+        numbers = [i+1 for i in indices]
+        axes.plot(positions, numbers, label=name)
+        axes.plot(positions, numbers, '.')
+    if len(selection) > 1:
+        axes.legend(loc='upper left')
+    axes.grid(alpha=0.4)
+    image = io.BytesIO()
+    figure.savefig(image, format='png')
+    return base64.b64encode(image.getvalue()).decode('ascii')
+
+
+class WortverbundServer:
+    """The HTTP service.
+
+    Args:
+        wb_directory: directory of the projects.
+        executor: executor for the CPU-heavy work (a thread pool if None).
+        check_interval: see "ProjectCache"."""
+
+    def __init__(self, wb_directory='wb_files', executor=None,
+                 check_interval=1.0):
+        self.wb_directory = wb_directory
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor()
+        self.executor = executor
+        self.cache = ProjectCache(wb_directory, executor, check_interval)
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.server = await asyncio.start_server(self.handle_connection, host,
+                                                 port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            if hasattr(self.server, 'close_clients'): # Python 3.13+
+                self.server.close_clients()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                status, body = await self.respond(request_line.decode('latin-1'))
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                writer.write(('HTTP/1.1 '+str(status)+' '+_REASONS.get(status, '')+'\r\n'
+                              'Content-Type: application/json; charset=utf-8\r\n'
+                              'Content-Length: '+str(len(payload))+'\r\n'
+                              'Connection: '+('keep-alive' if keep_alive else 'close')+'\r\n\r\n').encode('latin-1')
+                             +payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request_line):
+        """Returns the status and the (JSON) body answering a request."""
+        try:
+            try:
+                method, target, _ = request_line.split(' ', 2)
+            except ValueError:
+                raise HTTPError(400, 'Malformed request.')
+            if method != 'GET':
+                raise HTTPError(405, 'Only GET is supported.')
+            url = urllib.parse.urlsplit(target)
+            parts = [urllib.parse.unquote(part) for part in url.path.strip('/').split('/')]
+            query = urllib.parse.parse_qs(url.query)
+            return 200, await self.route(parts, query)
+        except HTTPError as error:
+            return error.status, {'error': str(error)}
+        except ValueError as error:
+            return 400, {'error': str(error)}
+        except Exception as error:
+            return 500, {'error': str(error)}
+
+    async def route(self, parts, query):
+        if parts == ['projects']:
+            return {'projects': sorted(project for project in os.listdir(self.wb_directory)
+                                       if not '.' in project)}
+        if len(parts) < 2 or parts[0] != 'projects':
+            raise HTTPError(404, 'Unknown resource.')
+        project = parts[1]
+        wortverbund = await self.cache.get(project)
+        start = query.get('start', [None])[0]
+        end = query.get('end', [None])[0]
+        if len(parts) == 2:
+            return {'project': project,
+                    'wortverbund': [{'name': name, 'features': len(prepared[0])}
+                                    for name, (_, prepared) in wortverbund.items()]}
+        # The wortverbund have their own prefix, so a wortverbund can be named
+        # like a fixed route (e.g. "plot").
+        if len(parts) == 4 and parts[2] == 'wortverbund':
+            return self._features(project, wortverbund, parts[3], query, start,
+                                  end)
+        if len(parts) != 3 or parts[2] not in ('curves', 'plot'):
+            raise HTTPError(404, 'Unknown resource.')
+        names = query.get('wortverbund', sorted(wortverbund))
+        for name in names:
+            if name not in wortverbund:
+                raise HTTPError(404, 'There is no wortverbund "'+name+'".')
+        selection = [(name, wortverbund[name][1]) for name in names]
+        loop = asyncio.get_running_loop()
+        if parts[2] == 'plot':
+            image = await loop.run_in_executor(self.executor, _render_plot,
+                                               project, selection, start,
+                                               end)
+            return {'project': project, 'content_type': 'image/png',
+                    'image': image}
+        return await loop.run_in_executor(self.executor, self._curves,
+                                          project, selection, start, end)
+
+    @staticmethod
+    def _features(project, wortverbund, name, query, start, end):
+        if name not in wortverbund:
+            raise HTTPError(404, 'There is no wortverbund "'+name+'".')
+        content_list, smallest_values, highest_values, x_values = wortverbund[name][1]
+        limit = int(query['limit'][0]) if 'limit' in query else None
+        features = []
+        for i in wb_func.features_in_range(content_list, x_values, start, end,
+                                           smallest_values, highest_values):
+            if limit is not None and len(features) >= limit:
+                break
+            features.append({'feature': content_list[i][0],
+                             'position': wb_func.format_position(content_list[i][1]),
+                             'x_value': x_values[i]})
+        return {'project': project, 'wortverbund': name, 'features': features}
+
+    @staticmethod
+    def _curves(project, selection, start, end):
+        curves = {}
+        points = []
+        for name, (content_list, smallest_values, highest_values, x_values) in selection:
+            indices = wb_func.features_in_range(content_list, x_values, start,
+                                                end, smallest_values,
+                                                highest_values)
+            curves[name] = [[x_values[i], i+1] for i in indices]
+            points.extend(point[0] for point in curves[name])
+        # The aggregated curve counts the features of all selected wortverbund
+        # (within the range) up to every x-value.
+        points.sort()
+        total = [[x_value, i+1] for i, x_value in enumerate(points)]
+        return {'project': project, 'curves': curves, 'total': total}
+
+
+@contextlib.contextmanager
+def serve_in_background(wb_directory='wb_files', host='127.0.0.1', port=0,
+                        **kwargs):
+    """Runs a "WortverbundServer" in a background thread while the context is
+        active and yields its base URL (e.g. "http://127.0.0.1:41234"); with
+        "port=0" a free port is used."""
+    loop = asyncio.new_event_loop()
+    server = WortverbundServer(wb_directory, **kwargs)
+    started = threading.Event()
+    address = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        address.extend(loop.run_until_complete(server.start(host, port)))
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    try:
+        yield 'http://'+str(address[0])+':'+str(address[1])
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        server.executor.shutdown()
+
+
+def fetch(base_url, path, **query):
+    """Requests "path" (e.g. "/projects") from a running service and returns
+        the decoded JSON body (raises "urllib.error.HTTPError" on errors)."""
+    url = base_url+urllib.parse.quote(path)
+    if query:
+        url += '?'+urllib.parse.urlencode(query, doseq=True)
+    with urllib.request.urlopen(url) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve wortverbund_builder projects over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--wb-directory', default='wb_files')
+    args = parser.parse_args()
+
+    async def serve():
+        server = WortverbundServer(args.wb_directory)
+        host, port = await server.start(args.host, args.port)
+        print('Serving "'+args.wb_directory+'" on http://'+str(host)+':'+str(port))
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# wb_shm.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Publishes loaded projects in shared memory, so worker processes can use
+    them without reading the files again and without copying, e.g.:
+
+        with wb_shm.publish(['irrungen-wirrungen_page']) as dataset:
+            with multiprocessing.Pool(initializer=wb_shm.attach_worker,
+                                      initargs=(dataset.descriptor,)) as pool:
+                results = pool.map(analyse, range(len(dataset.wortverbund_names)))
+
+        def analyse(wortverbund_code):
+            dataset = wb_shm.worker_dataset()
+            first, last = dataset.wortverbund_rows(wortverbund_code)
+            return dataset.x_value[first:last].mean()
+
+    The columns are the same as those of an NPZ dataset (see "wb_export.py"),
+    each one in its own "multiprocessing.shared_memory" block with a NumPy
+    array on top. Only the (small) descriptor of the blocks is passed to the
+    workers. The blocks are freed when the publishing "SharedDataset" is
+    closed (at the end of the "with" block)."""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import wb_export
+
+
+class SharedDataset(wb_export.NpzDataset):
+    """Columns of one or more projects in shared memory (see
+        "wb_export.NpzDataset" for the arrays and methods).
+
+    Use "publish" to create the blocks and "attach" to use them in another
+    process; call "close" (or use it as context manager) when done."""
+
+    def __init__(self, descriptor, blocks=None):
+        self.path = None
+        self.descriptor = descriptor
+        # The publishing dataset gets the blocks it created.
+        self.owner = blocks is not None
+        self.blocks = list(blocks or [])
+        self.arrays = {}
+        self._string_tables = {}
+        try:
+            for i, (name, (block_name, dtype, length)) in enumerate(descriptor.items()):
+                if not self.owner:
+                    self.blocks.append(_open_block(block_name))
+                self.arrays[name] = np.ndarray((length,), dtype=np.dtype(dtype),
+                                               buffer=self.blocks[i].buf)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def wortverbund_names(self):
+        return self.strings('wortverbund_names')
+
+    def wortverbund_rows(self, wortverbund_code):
+        """Returns "(first, last)": the rows of a wortverbund are
+            "first <= i < last" (sorted by position)."""
+        return (int(self.wortverbund_offsets[wortverbund_code]),
+                int(self.wortverbund_offsets[wortverbund_code+1]))
+
+    def close(self):
+        """Releases the arrays; the publishing dataset also frees the blocks.
+
+        Arrays (or views of them) taken from the dataset must not be used
+        afterwards."""
+        self.arrays = {}
+        self._string_tables = {}
+        for block in self.blocks:
+            try:
+                block.close()
+            except BufferError:
+                # Views of the block are still referenced somewhere; the
+                # memory is freed as soon as they are gone.
+                pass
+            if self.owner:
+                try:
+                    block.unlink()
+                except FileNotFoundError:
+                    pass
+        self.blocks = []
+
+
+def _open_block(block_name):
+    # Attaching processes must not unlink the block when they exit (the
+    # publishing process owns it). Worker processes share the resource tracker
+    # of the publishing process, which only unlinks blocks that are left when
+    # the publishing process ends; newer Pythons can skip tracking anyway.
+    try:
+        return shared_memory.SharedMemory(block_name, track=False)
+    except TypeError: # Python < 3.13
+        return shared_memory.SharedMemory(block_name)
+
+
+def _columns(projects, wb_directory):
+    # Returns the columns of the projects as NumPy arrays (like
+    # "wb_export._NpzWriter").
+    projects_table = wb_export._StringTable()
+    wortverbund_table = wb_export._StringTable()
+    features_table = wb_export._StringTable()
+    parts = {name: [] for name in ('project', 'wortverbund', 'feature',
+                                   'position_lengths', 'position_values',
+                                   'x_value')}
+    wortverbund_project = []
+    wortverbund_sizes = []
+    for project, wortverbund, content_list, x_values in wb_export.iter_wortverbund(projects, wb_directory):
+        project_code = projects_table.encode(project)
+        wortverbund_code = wortverbund_table.encode(project+'/'+wortverbund)
+        wortverbund_project.append(project_code)
+        wortverbund_sizes.append(len(content_list))
+        size = len(content_list)
+        parts['project'].append(np.full(size, project_code, dtype=np.int32))
+        parts['wortverbund'].append(np.full(size, wortverbund_code, dtype=np.int32))
+        parts['feature'].append(np.array([features_table.encode(row[0]) for row in content_list],
+                                         dtype=np.int32))
+        parts['position_lengths'].append(np.array([len(row[1]) for row in content_list],
+                                                  dtype=np.int64))
+        parts['position_values'].append(np.array([value for row in content_list for value in row[1]],
+                                                 dtype=np.int64))
+        parts['x_value'].append(np.array(x_values, dtype=np.float64))
+    dtypes = {'project': np.int32, 'wortverbund': np.int32, 'feature': np.int32,
+              'position_lengths': np.int64, 'position_values': np.int64,
+              'x_value': np.float64}
+    columns = {name: np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtypes[name])
+               for name, arrays in parts.items()}
+    position_offsets = np.zeros(len(columns['x_value'])+1, dtype=np.int64)
+    np.cumsum(columns.pop('position_lengths'), out=position_offsets[1:])
+    columns['position_offsets'] = position_offsets
+    wortverbund_offsets = np.zeros(len(wortverbund_sizes)+1, dtype=np.int64)
+    np.cumsum(np.array(wortverbund_sizes, dtype=np.int64), out=wortverbund_offsets[1:])
+    columns['wortverbund_offsets'] = wortverbund_offsets
+    columns['wortverbund_project'] = np.array(wortverbund_project, dtype=np.int32)
+    for name, table in (('project_names', projects_table),
+                        ('wortverbund_names', wortverbund_table),
+                        ('feature_names', features_table)):
+        columns[name+'_blob'], columns[name+'_offsets'] = table.to_arrays()
+    return columns
+
+
+def publish(projects=None, wb_directory='wb_files'):
+    """Loads projects (all projects if "projects" is None) into shared
+        memory.
+
+    Returns the publishing "SharedDataset"; pass its "descriptor" to the
+        workers (see "attach" and "attach_worker")."""
+    descriptor = {}
+    blocks = []
+    try:
+        for name, array in _columns(projects, wb_directory).items():
+            # Blocks can't be empty.
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            descriptor[name] = (block.name, array.dtype.str, len(array))
+    except BaseException:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+    return SharedDataset(descriptor, blocks)
+
+
+def attach(descriptor):
+    """Returns a "SharedDataset" using the blocks of "descriptor" (without
+        copying them)."""
+    return SharedDataset(descriptor)
+
+
+_worker_dataset = None
+
+
+def attach_worker(descriptor):
+    """Initializer for worker pools: attaches the dataset once per worker
+        process (see "worker_dataset")."""
+    global _worker_dataset
+    if _worker_dataset is not None:
+        _worker_dataset.close()
+    _worker_dataset = attach(descriptor)
+
+
+def worker_dataset():
+    """Returns the dataset attached by "attach_worker"."""
+    if _worker_dataset is None:
+        raise RuntimeError('No dataset attached to this process')
+    return _worker_dataset
@@ -0,0 +1,177 @@
+# wb_similarity.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Calculates the similarities (in the sense of sign_compare) of all
+    wortverbund of a project at once.
+
+    The feature sets of the wortverbund are vectorized into a (sparse) binary
+    term matrix; the intersections of all pairs of feature sets are then
+    given by a single matrix product, from which the Jaccard or cosine
+    similarities follow. Results are cached in "wb_files/.cache" and reused
+    as long as no wortverbund file of the project has changed."""
+
+import os
+
+import numpy as np
+try:
+    import scipy.sparse
+except ImportError:
+    scipy = None
+
+import wb_func
+
+METRICS = ('jaccard', 'cosine')
+
+
+def read_feature_sets(project, start=None, end=None, wb_directory='wb_files'):
+    """Reads the feature sets of all wortverbund of a project.
+
+    Args:
+        project: name of the project.
+        start: if given, only features at or after this position (e.g.
+            "6/1") are used.
+        end: if given, only features at or before this position are used.
+        wb_directory: directory of the projects.
+
+    Returns:
+        wortverbund_names: list of the names of the wortverbund.
+        feature_sets: list of the sets of features of the wortverbund."""
+    wortverbund_names = []
+    feature_sets = []
+    for wortverbund_file in sorted(os.listdir(wb_directory+'/'+project)):
+        content_list = wb_func.read_wortverbund(wb_directory+'/'+project+'/'+wortverbund_file)
+        if start is not None or end is not None:
+            # Restricts the features to the range in the same way as
+            # "WortverbundShow.show_entries" does.
+            content_list, smallest_values, highest_values, x_values = wb_func.prepare_wortverbund(content_list)
+            lower = float('-inf')
+            upper = float('inf')
+            if start is not None:
+                lower = wb_func.encode_position(start, smallest_values,
+                                                highest_values)
+            if end is not None:
+                upper = wb_func.encode_position(end, smallest_values,
+                                                highest_values)
+            if lower > upper:
+                lower, upper = upper, lower
+            content_list = [content_list[i] for i in range(len(content_list))
+                            if lower <= x_values[i] <= upper]
+        wortverbund_names.append(wortverbund_file[:-4])
+        feature_sets.append({row[0] for row in content_list if row[0]})
+    return wortverbund_names, feature_sets
+
+
+def term_matrix(feature_sets):
+    """Vectorizes feature sets into a binary term matrix.
+
+    Returns:
+        vocabulary: list of all features (the columns of the matrix).
+        matrix: binary matrix with one row per feature set ("scipy.sparse"
+            CSR matrix if SciPy is available, else a dense NumPy array)."""
+    vocabulary = {}
+    rows = []
+    columns = []
+    for i, feature_set in enumerate(feature_sets):
+        for feature in feature_set:
+            rows.append(i)
+            columns.append(vocabulary.setdefault(feature, len(vocabulary)))
+    shape = (len(feature_sets), len(vocabulary))
+    if scipy is not None:
+        matrix = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.float32),
+                                          (rows, columns)), shape=shape)
+    else:
+        matrix = np.zeros(shape, dtype=np.float32)
+        matrix[rows, columns] = 1
+    return list(vocabulary), matrix
+
+
+def pairwise_similarities(matrix, metric='jaccard'):
+    """Calculates the similarities of all pairs of rows of a binary term
+        matrix.
+
+    Args:
+        matrix: term matrix as returned by "term_matrix".
+        metric: "jaccard" or "cosine".
+
+    Returns a dense (n x n) NumPy array of similarities."""
+    if metric not in METRICS:
+        raise ValueError('Unknown metric "'+str(metric)+'"')
+    intersections = matrix @ matrix.T
+    if scipy is not None and scipy.sparse.issparse(intersections):
+        intersections = intersections.toarray()
+    intersections = np.asarray(intersections, dtype=np.float64)
+    sizes = np.diag(intersections)
+    if metric == 'jaccard':
+        denominators = sizes[:, None]+sizes[None, :]-intersections
+    else:
+        denominators = np.sqrt(np.outer(sizes, sizes))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        similarities = np.where(denominators > 0,
+                                intersections/denominators, 0.0)
+    # Two empty feature sets are regarded as equal.
+    np.fill_diagonal(similarities, 1.0)
+    return similarities
+
+
+def _project_mtimes(project, wb_directory):
+    return [(wortverbund_file, os.stat(wb_directory+'/'+project+'/'+wortverbund_file).st_mtime_ns)
+            for wortverbund_file in sorted(os.listdir(wb_directory+'/'+project))]
+
+
+def _cache_path(project, metric, start, end, wb_directory):
+    name = project+'_'+metric
+    if start is not None or end is not None:
+        name += '_'+str(start).replace('/', '-')+'_'+str(end).replace('/', '-')
+    return wb_directory+'/.cache/similarity/'+name+'.npz'
+
+
+def similarity_matrix(project, metric='jaccard', start=None, end=None,
+                      wb_directory='wb_files', use_cache=True):
+    """Calculates the similarities of all pairs of wortverbund of a project.
+
+    Args:
+        project: name of the project.
+        metric: "jaccard" or "cosine".
+        start: see "read_feature_sets".
+        end: see "read_feature_sets".
+        wb_directory: directory of the projects.
+        use_cache: whether a cached result may be used (and the result
+            cached).
+
+    Returns:
+        wortverbund_names: list of the names of the wortverbund.
+        similarities: (n x n) NumPy array; "similarities[i, j]" is the
+            similarity of "wortverbund_names[i]" and "wortverbund_names[j]"."""
+    if metric not in METRICS:
+        raise ValueError('Unknown metric "'+str(metric)+'"')
+    mtimes = _project_mtimes(project, wb_directory)
+    cache_path = _cache_path(project, metric, start, end, wb_directory)
+    if use_cache and os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if (cache['files'].tolist() == [file for file, _ in mtimes]
+                    and cache['mtimes'].tolist() == [mtime for _, mtime in mtimes]):
+                return cache['names'].tolist(), cache['similarities']
+
+    wortverbund_names, feature_sets = read_feature_sets(project, start, end,
+                                                        wb_directory)
+    similarities = pairwise_similarities(term_matrix(feature_sets)[1], metric)
+    if use_cache:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        np.savez(cache_path, files=np.array([file for file, _ in mtimes], dtype=str),
+                 mtimes=np.array([mtime for _, mtime in mtimes], dtype=np.int64),
+                 names=np.array(wortverbund_names, dtype=str),
+                 similarities=similarities)
+    return wortverbund_names, similarities
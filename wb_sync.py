@@ -0,0 +1,124 @@
+# wb_sync.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keeps sign_compare files up to date with their wortverbund files.
+
+    After every synchronization the byte offset up to which the wortverbund
+    file was converted is remembered (in "wb_files/.cache/sync") together
+    with the inode of the file, a digest of the bytes just before the offset
+    (see "wb_watch.offset_digest") and the size of the sign_compare file. The
+    next synchronization then only converts and appends the features added
+    behind that offset. The sign_compare file is written completely again if
+    features were removed (removing rewrites the wortverbund file, so its
+    inode or the bytes before the offset change; the inode alone can't tell,
+    since the file system hands out the inodes of replaced files again) or if
+    the sign_compare file was changed otherwise."""
+
+import csv
+import json
+import os
+
+import wb_lock
+import wb_watch
+
+UNCHANGED = 'unchanged'
+APPENDED = 'appended'
+REWRITTEN = 'rewritten'
+
+
+def _state_path(project, wortverbund, wb_directory):
+    return wb_directory+'/.cache/sync/'+project+'/'+wortverbund+'.json'
+
+
+def _read_state(path):
+    try:
+        with open(path, 'r') as state_file:
+            return json.load(state_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def read_features(data):
+    """Returns the features of (complete lines of) a wortverbund file."""
+    return [row[0] for row in csv.reader(data.decode('utf-8').splitlines(), delimiter=';')
+            if row and row[0]]
+
+
+def sync(project, wortverbund, wb_directory='wb_files', sc_directory='sc_files',
+         rewrite=False):
+    """Brings the sign_compare file of a wortverbund up to date.
+
+    Args:
+        project: name of the project.
+        wortverbund: name of the wortverbund.
+        wb_directory: directory of the projects.
+        sc_directory: directory of the sign_compare files.
+        rewrite: if True, the sign_compare file is written completely again.
+
+    Returns:
+        change: "UNCHANGED", "APPENDED" or "REWRITTEN".
+        number: number of features written."""
+    path = wb_directory+'/'+project+'/'+wortverbund+'.csv'
+    sc_path = sc_directory+'/'+wortverbund+'.txt'
+    state_path = _state_path(project, wortverbund, wb_directory)
+    with wb_lock.wortverbund_lock(project, wortverbund, wb_directory):
+        with open(path, 'rb') as wortverbund_file:
+            inode = os.fstat(wortverbund_file.fileno()).st_ino
+            state = None if rewrite else _read_state(state_path)
+            try:
+                sc_size = os.path.getsize(sc_path)
+            except FileNotFoundError:
+                sc_size = None
+            if (state is not None and state['inode'] == inode
+                    and state['sc_directory'] == sc_directory
+                    and state['sc_size'] == sc_size
+                    and os.fstat(wortverbund_file.fileno()).st_size >= state['offset']
+                    and state.get('digest') == wb_watch.offset_digest(wortverbund_file,
+                                                                      state['offset'])):
+                offset = state['offset']
+                change = APPENDED
+            else:
+                offset = 0
+                change = REWRITTEN
+            wortverbund_file.seek(offset)
+            data = wortverbund_file.read()
+            # Only complete lines are converted; an incomplete last line (which
+            # is still being written) is converted with the next
+            # synchronization.
+            end = data.rfind(b'\n')+1
+            digest = wb_watch.offset_digest(wortverbund_file, offset+end)
+        features = read_features(data[:end])
+        # The format of sign_compare files: every feature followed by ";".
+        feature_string = ''.join(feature+';' for feature in features)
+        os.makedirs(sc_directory, exist_ok=True)
+        if change == REWRITTEN and (features or sc_size is not None):
+            wb_lock.atomic_write(sc_path, feature_string)
+        elif features:
+            with open(sc_path, 'a') as sign_compare_file:
+                sign_compare_file.write(feature_string)
+        else:
+            change = UNCHANGED
+        try:
+            sc_size = os.path.getsize(sc_path)
+        except FileNotFoundError:
+            sc_size = None
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+        wb_lock.atomic_write(state_path,
+                             json.dumps({'offset': offset+end, 'inode': inode,
+                                         'digest': digest,
+                                         'sc_directory': sc_directory,
+                                         'sc_size': sc_size}))
+    return change, len(features)
@@ -0,0 +1,275 @@
+# wb_tasks.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A task scheduler running the loading and calculation stages of
+    "wortverbund_builder.py" in the background so the Tk mainloop never
+    blocks."""
+
+import concurrent.futures
+import os
+import queue
+import threading
+
+import wb_func
+import wb_watch
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task (by "Task.report") when the task was cancelled."""
+
+
+class Task:
+    """A single background task.
+
+    The function of a task is called with the task itself as first argument,
+    so it can report progress ("task.report(...)") and check whether it was
+    cancelled ("task.cancelled")."""
+
+    def __init__(self, scheduler, key, on_done, on_progress, on_error):
+        self.scheduler = scheduler
+        self.key = key
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Cancels the task; results it may still deliver are dropped."""
+        self._cancel_event.set()
+        if self.scheduler._tasks.get(self.key) is self:
+            del self.scheduler._tasks[self.key]
+
+    def report(self, *progress):
+        """Passes "progress" on to "on_progress" (in the mainloop); raises
+            "TaskCancelled" if the task was cancelled in the meantime."""
+        if self.cancelled:
+            raise TaskCancelled
+        if self.on_progress is not None:
+            self.scheduler._results.put((self, 'progress', progress))
+
+
+class TaskScheduler:
+    """Runs functions on a thread pool and passes their progress
+        and results back to the Tk mainloop by polling with "after".
+
+        Every task is submitted under a key (e.g. "show" or "plot_all"). A task
+        submitted under a key that is already in use supersedes the older one:
+        the older task gets cancelled and its results are dropped, so stale
+        results never reach the GUI after the user changed the selection.
+
+    Args:
+        master: Tk widget whose "after" method is used for polling.
+        executor: a "concurrent.futures" thread pool executor (one with four
+            workers if None); the tasks report progress to the scheduler, so
+            they have to run in this process.
+        poll_interval: time in ms between two polls of the result queue."""
+
+    def __init__(self, master, executor=None, poll_interval=50):
+        self.master = master
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        self.executor = executor
+        self.poll_interval = poll_interval
+        self._results = queue.Queue()
+        self._tasks = {}
+        self._polling = None
+
+    def submit(self, key, function, *args, on_done=None, on_progress=None,
+               on_error=None):
+        """Runs "function(task, *args)" in the background.
+
+        Args:
+            key: key of the task; an older task with the same key is
+                cancelled.
+            function: the function to run.
+            on_done: called with the result of "function" in the mainloop.
+            on_progress: called with the arguments of every "task.report"
+                in the mainloop.
+            on_error: called with the exception raised by "function" in the
+                mainloop.
+
+        Returns the "Task"."""
+        self.cancel(key)
+        task = Task(self, key, on_done, on_progress, on_error)
+        self._tasks[key] = task
+        future = self.executor.submit(function, task, *args)
+        future.add_done_callback(lambda future: self._finish(task, future))
+        if self._polling is None:
+            self._polling = self.master.after(self.poll_interval, self._poll)
+        return task
+
+    def cancel(self, key):
+        """Cancels the task with the key "key" (if there is one)."""
+        task = self._tasks.get(key)
+        if task is not None:
+            task.cancel()
+
+    def cancel_all(self):
+        for key in list(self._tasks):
+            self.cancel(key)
+
+    def shutdown(self):
+        self.cancel_all()
+        if self._polling is not None:
+            try:
+                self.master.after_cancel(self._polling)
+            except Exception:
+                pass
+            self._polling = None
+        self.executor.shutdown(wait=False)
+
+    def _finish(self, task, future):
+        # Called in a worker thread: only passes the outcome on to the queue.
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if isinstance(exception, TaskCancelled):
+            return
+        if exception is not None:
+            self._results.put((task, 'error', exception))
+        else:
+            self._results.put((task, 'done', future.result()))
+
+    def _is_current(self, task):
+        return (not task.cancelled
+                and self._tasks.get(task.key) is task)
+
+    def _poll(self):
+        # Called in the mainloop: dispatches everything that has arrived. The
+        # next poll is scheduled before dispatching, so a callback entering a
+        # nested event loop (e.g. "plt.show") doesn't hold back the results of
+        # other tasks.
+        self._polling = self.master.after(self.poll_interval, self._poll)
+        while True:
+            try:
+                task, kind, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if not self._is_current(task):
+                continue # drops results of cancelled or superseded tasks
+            if kind == 'progress':
+                task.on_progress(*value)
+                continue
+            del self._tasks[task.key]
+            if kind == 'done':
+                if task.on_done is not None:
+                    task.on_done(value)
+            elif task.on_error is not None:
+                task.on_error(value)
+        if not self._tasks and self._results.empty() and self._polling is not None:
+            self.master.after_cancel(self._polling)
+            self._polling = None
+
+
+def load_wortverbund(task, path):
+    """Task function reading, sorting and encoding a wortverbund file.
+
+    Returns a "wb_watch.WortverbundData" (which can be kept up to date with
+        the file later on)."""
+    data = wb_watch.WortverbundData(path)
+    task.report(path)
+    return data
+
+
+def refresh_wortverbund(task, data):
+    """Task function bringing a "wb_watch.WortverbundData" up to date with its
+        file (which may mean reading it again completely).
+
+    Returns the change (see "wb_watch.WortverbundData.refresh")."""
+    return data.refresh()
+
+
+def poll_project(task, watcher):
+    """Task function checking the files of a "wb_watch.ProjectWatcher" for
+        changes and updating their data.
+
+    Returns the changes (see "wb_watch.ProjectWatcher.poll")."""
+    return watcher.poll()
+
+
+def load_project(task, project_directory):
+    """Task function reading, sorting and encoding every wortverbund file of a
+        project; reports "(number of files done, number of files, wortverbund
+        name, wb_watch.WortverbundData)" after every file.
+
+    Returns a list of "(wortverbund name, wb_watch.WortverbundData)"."""
+    wortverbund_files = os.listdir(project_directory)
+    results = []
+    for wortverbund_file in wortverbund_files:
+        results.append((wortverbund_file[:-4],
+                        wb_watch.WortverbundData(project_directory+'/'+wortverbund_file)))
+        task.report(len(results), len(wortverbund_files), *results[-1])
+    return results
+
+
+def sample_wortverbund(path, max_points=200):
+    """Reads a sample of about "max_points" features of a wortverbund file
+        (a line behind each of "max_points" evenly spaced byte offsets; the
+        whole file if it is small) and estimates where they are in the sorted
+        wortverbund.
+
+    Returns "(x_values, numbers, features, positions)" of the sample
+        (sorted; the numbers being estimated from the size of the file)."""
+    size = os.path.getsize(path)
+    lines = []
+    with open(path, 'rb') as wortverbund_file:
+        if size <= max_points*128:
+            lines = wortverbund_file.read().splitlines()
+        else:
+            for i in range(max_points):
+                wortverbund_file.seek(size*i//max_points)
+                if i:
+                    wortverbund_file.readline() # skips the cut line
+                line = wortverbund_file.readline()
+                if line.endswith(b'\n'):
+                    lines.append(line)
+    content_list = []
+    for line in lines:
+        try:
+            feature, position = line.decode('utf-8').rstrip('\r\n').rsplit(';', 1)
+            content_list.append([feature, [int(value) for value in position.split('/')]])
+        except ValueError:
+            continue # a preview ignores unreadable lines
+    if not content_list:
+        return [], [], [], []
+    content_list, _, _, x_values = wb_func.prepare_wortverbund(content_list)
+    if size <= max_points*128:
+        total = len(content_list)
+    else:
+        total = size*len(lines)/sum(len(line) for line in lines)
+    numbers = [(j+1)*total/len(content_list) for j in range(len(content_list))]
+    return (x_values, numbers, [row[0] for row in content_list],
+            [wb_func.format_position(row[1]) for row in content_list])
+
+
+def preview_project(task, project_directory, max_points=200):
+    """Task function sampling every wortverbund file of a project (see
+        "sample_wortverbund").
+
+    Returns a list of "(wortverbund name, sample)"."""
+    wortverbund_files = os.listdir(project_directory)
+    results = []
+    for wortverbund_file in wortverbund_files:
+        if task.cancelled:
+            raise TaskCancelled
+        results.append((wortverbund_file[:-4],
+                        sample_wortverbund(project_directory+'/'+wortverbund_file,
+                                           max_points)))
+    return results
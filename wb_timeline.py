@@ -0,0 +1,311 @@
+# wb_timeline.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Queries the features of many wortverbund (of one or more projects) as one
+    chronological stream, e.g. everything that happened between 1870 and 1880
+    in all "_date" projects:
+
+        with Timeline() as timeline:
+            timeline.add_project('project_1_date')
+            timeline.add_project('project_2_date')
+            for position, project, wortverbund, feature, x_value in timeline.query('1870', '1880'):
+                ...
+
+    Every wortverbund is opened as a sorted stream of its features; the
+    streams are merged lazily with "heapq.merge" on the positions themselves
+    (the x-values are calculated per wortverbund and so can't be compared
+    between wortverbund).
+
+    The sorted stream of every wortverbund (features, positions and x-values)
+    is persisted in "wb_files/.cache/timeline" and only rebuilt when the
+    wortverbund file has changed since (see "wb_lock.version"). A query
+    binary searches the first position of the range in every cached stream
+    and then reads the streams lazily, so "heapq.merge" stops reading as soon
+    as "limit" features are returned: a repeated query only reads the
+    features it returns (plus one line per stream). The first query after a
+    change sorts the wortverbund once (out of core if "chunk_size" is given,
+    see "wb_extsort.py")."""
+
+import bisect
+import csv
+import heapq
+import itertools
+import os
+import tempfile
+
+import wb_func
+import wb_lock
+
+WB_DIRECTORY = 'wb_files'
+
+
+def _position_key(row):
+    return row[1]
+
+
+def _entry_key(entry):
+    return entry[0]
+
+
+def _parse_line(line):
+    feature, position, x_value = next(csv.reader([line.decode('utf-8')], delimiter=';'))
+    return feature, parse_position(position), float(x_value)
+
+
+def _header(version):
+    return ('#'+';'.join(str(value) for value in version)+'\n').encode('utf-8')
+
+
+def _seek(cache_file, position, first, size):
+    """Moves "cache_file" to the first line (at or after the byte "first") with
+        a position not smaller than "position"."""
+    low, high = first, size
+    while low < high:
+        middle = (low+high)//2
+        cache_file.seek(middle)
+        if middle > first:
+            # Skips the (rest of the) line "middle" points into.
+            cache_file.readline()
+        line = cache_file.readline()
+        if not line or _parse_line(line)[1] >= position:
+            high = middle
+        else:
+            low = middle+1
+    cache_file.seek(low)
+    if low > first:
+        cache_file.readline()
+
+
+def parse_position(position):
+    """Returns a position string (e.g. "1870/5") as list of values (positions
+        given as list or number are returned as list)."""
+    if position is None or isinstance(position, list):
+        return position
+    if isinstance(position, int):
+        return [position]
+    return [int(value) for value in position.split('/')]
+
+
+def range_limits(start=None, end=None):
+    """Returns the limits of a range of positions as "(start, stop)": a
+        position is within the range if "start <= position < stop" (either
+        limit being None if the range is open).
+
+    The end is inclusive with all of its more specific positions, e.g. the
+    end "1880" includes "1880/12/31"."""
+    start = parse_position(start)
+    end = parse_position(end)
+    if start is not None and end is not None and end < start:
+        start, end = end, start
+    if end is None:
+        return start, None
+    return start, end[:-1]+[end[-1]+1]
+
+
+class SortedStream:
+    """The sorted features of a wortverbund, read from a persisted cache (if
+        "cache_directory" is given), from memory or (if "chunk_size" is
+        given) out of core (see "wb_extsort.py").
+
+    Args:
+        project: name of the project.
+        wortverbund: name of the wortverbund.
+        path: path of the wortverbund file.
+        chunk_size: maximal number of features held in memory at a time
+            (the whole wortverbund is held in memory if None).
+        cache_directory: directory of the persisted sorted stream (not
+            persisted if None)."""
+
+    def __init__(self, project, wortverbund, path, chunk_size=None,
+                 cache_directory=None):
+        self.project = project
+        self.wortverbund = wortverbund
+        self.external_wortverbund = None
+        self.cache_path = None
+        if cache_directory is not None:
+            self.cache_path = cache_directory+'/'+wortverbund+'.csv'
+            self._update_cache(path, chunk_size, cache_directory)
+        elif chunk_size is None:
+            (self.content_list, _, _,
+             self.x_values) = wb_func.prepare_wortverbund(wb_func.read_wortverbund(path))
+        else:
+            import wb_extsort
+
+            self.external_wortverbund = wb_extsort.ExternalWortverbund(path, chunk_size)
+
+    def _update_cache(self, path, chunk_size, cache_directory):
+        """Writes the sorted features of the wortverbund to the cache unless
+            it is up to date."""
+        version = wb_lock.version(path)
+        header = _header(version)
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                if cache_file.readline() == header:
+                    return
+        except FileNotFoundError:
+            pass
+        if chunk_size is None:
+            content_list, _, _, x_values = wb_func.prepare_wortverbund(wb_func.read_wortverbund(path))
+            features = ((feature, position, x_value) for (feature, position), x_value
+                        in zip(content_list, x_values))
+        else:
+            import wb_extsort
+
+            external_wortverbund = wb_extsort.ExternalWortverbund(path, chunk_size)
+            features = external_wortverbund.iter_features()
+        os.makedirs(cache_directory, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=cache_directory)
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8', newline='') as cache_file:
+                cache_file.write(header.decode('utf-8'))
+                writer = csv.writer(cache_file, delimiter=';', lineterminator='\n')
+                for feature, position, x_value in features:
+                    writer.writerow([feature, wb_func.format_position(position), repr(x_value)])
+            os.replace(temp_path, self.cache_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        finally:
+            if chunk_size is not None:
+                external_wortverbund.close()
+
+    def close(self):
+        if self.external_wortverbund is not None:
+            self.external_wortverbund.close()
+
+    def _cached_entries(self, start, stop):
+        with open(self.cache_path, 'rb') as cache_file:
+            first = len(cache_file.readline())
+            if start is not None:
+                _seek(cache_file, start, first, os.fstat(cache_file.fileno()).st_size)
+            for line in cache_file:
+                feature, position, x_value = _parse_line(line)
+                if stop is not None and position >= stop:
+                    return
+                yield position, self.project, self.wortverbund, feature, x_value
+
+    def entries(self, start=None, stop=None):
+        """Yields "(position, project, wortverbund, feature, x-value)" for every
+            feature with "start <= position < stop" in sorted order (see
+            "range_limits")."""
+        if self.cache_path is not None:
+            yield from self._cached_entries(start, stop)
+            return
+        if self.external_wortverbund is not None:
+            features = self.external_wortverbund.iter_features()
+            if start is not None:
+                features = itertools.dropwhile(lambda feature: feature[1] < start, features)
+            if stop is not None:
+                features = itertools.takewhile(lambda feature: feature[1] < stop, features)
+            for feature, position, x_value in features:
+                yield position, self.project, self.wortverbund, feature, x_value
+            return
+        first = 0
+        last = len(self.content_list)
+        if start is not None:
+            first = bisect.bisect_left(self.content_list, start, key=_position_key)
+        if stop is not None:
+            last = bisect.bisect_left(self.content_list, stop, lo=first,
+                                      key=_position_key)
+        for i in range(first, last):
+            yield (self.content_list[i][1], self.project, self.wortverbund,
+                   self.content_list[i][0], self.x_values[i])
+
+
+class Timeline:
+    """A set of wortverbund (of one or more projects of the same kind) queried
+        as one stream.
+
+    Args:
+        wb_directory: directory of the projects.
+        chunk_size: see "SortedStream".
+        use_cache: whether the sorted streams are persisted in
+            "wb_directory/.cache/timeline".
+
+    Use it as context manager (or call "close") to remove the temporary files
+    of out of core streams."""
+
+    def __init__(self, wb_directory=WB_DIRECTORY, chunk_size=None, use_cache=True):
+        self.wb_directory = wb_directory
+        self.chunk_size = chunk_size
+        self.use_cache = use_cache
+        self.kind = None
+        self.streams = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for stream in self.streams:
+            stream.close()
+        self.streams = []
+
+    def add_wortverbund(self, project, wortverbund):
+        """Adds a wortverbund to the timeline.
+
+        Raises ValueError if the project is of another kind (e.g. "_page")
+            than the projects added before, as their positions can't be
+            compared."""
+        if self.kind is not None and project[-4:] != self.kind:
+            raise ValueError('\"'+project+'\" can\'t be put on a timeline of \"_'+self.kind+'\" projects')
+        self.kind = project[-4:]
+        cache_directory = None
+        if self.use_cache:
+            cache_directory = self.wb_directory+'/.cache/timeline/'+project
+        self.streams.append(SortedStream(project, wortverbund,
+                                         self.wb_directory+'/'+project+'/'+wortverbund+'.csv',
+                                         self.chunk_size, cache_directory))
+
+    def add_project(self, project, wortverbund_names=None):
+        """Adds all (or some) wortverbund of a project to the timeline."""
+        if wortverbund_names is None:
+            wortverbund_names = sorted(wortverbund_file[:-4] for wortverbund_file in
+                                       os.listdir(self.wb_directory+'/'+project))
+        for wortverbund in wortverbund_names:
+            self.add_wortverbund(project, wortverbund)
+
+    def query(self, start=None, end=None, limit=None):
+        """Yields "(position, project, wortverbund, feature, x-value)" for the
+            features of all wortverbund within a range in chronological order
+            (features at equal positions in the order the wortverbund were
+            added).
+
+        Args:
+            start: first position (e.g. "1870" or [1870]); open if None.
+            end: last position (inclusive, see "range_limits"); open if None.
+            limit: maximal number of features (no limit if None)."""
+        start, stop = range_limits(start, end)
+        entries = heapq.merge(*[stream.entries(start, stop) for stream in self.streams],
+                              key=_entry_key)
+        return itertools.islice(entries, limit)
+
+
+def query(projects, start=None, end=None, limit=None,
+          wb_directory=WB_DIRECTORY, chunk_size=None, use_cache=True):
+    """Yields the features of all wortverbund of "projects" (names of
+        projects or "(project, [wortverbund names])") within a range in
+        chronological order (see "Timeline.query")."""
+    with Timeline(wb_directory, chunk_size, use_cache) as timeline:
+        for project in projects:
+            if isinstance(project, str):
+                timeline.add_project(project)
+            else:
+                timeline.add_project(*project)
+        yield from timeline.query(start, end, limit)
@@ -0,0 +1,274 @@
+# wb_watch.py
+#
+# Copyright 2019 E. Decker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Watches wortverbund files and keeps their sorted and encoded data up to
+    date.
+
+    If a file grows, only the appended tail (from the last known byte offset)
+    is read and merged into the sorted data; the extremes and x-values are
+    only recalculated completely if the new features change the extremes.
+    If a file shrinks or is replaced (e.g. by "FeatureManager.remove"), it is
+    read again completely. A file counts as replaced if its inode changed or
+    if the bytes just before the offset changed (see "offset_digest"; the
+    inode alone can't tell, since the file system hands out the inodes of
+    replaced files again).
+
+    Changes are detected with inotify if the package "inotify_simple" is
+    installed and by polling the files' status otherwise."""
+
+import bisect
+import csv
+import hashlib
+import os
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+import wb_func
+
+UNCHANGED = 'unchanged'
+APPENDED = 'appended'
+RELOADED = 'reloaded'
+DELETED = 'deleted'
+DIGEST_WINDOW = 4096
+
+
+def offset_digest(binary_file, offset):
+    """Returns a digest of the "DIGEST_WINDOW" bytes of an open binary file in
+        front of "offset".
+
+    If the digest at the offset up to which a file was read is still the
+    same, the file was (almost certainly) only appended to: removing or
+    changing lines shifts or changes the bytes in front of the offset."""
+    start = max(0, offset-DIGEST_WINDOW)
+    binary_file.seek(start)
+    return hashlib.blake2b(binary_file.read(offset-start), digest_size=16).hexdigest()
+
+
+def _position_key(row):
+    return row[1]
+
+
+class WortverbundData:
+    """The sorted and encoded data of a wortverbund file.
+
+    Attributes:
+        content_list, smallest_values, highest_values, x_values: see
+            "wb_func.prepare_wortverbund".
+        offset: byte offset up to which the file was read."""
+
+    def __init__(self, path):
+        self.path = path
+        self.reload()
+
+    def reload(self):
+        """Reads the whole file again."""
+        with open(self.path, 'rb') as wortverbund_file:
+            self.stat = os.fstat(wortverbund_file.fileno())
+            data = wortverbund_file.read()
+            # Only complete lines are read; an incomplete last line (which is
+            # still being written) is read with the next refresh.
+            self.offset = data.rfind(b'\n')+1
+            self.digest = offset_digest(wortverbund_file, self.offset)
+        rows = self._parse(data[:self.offset])
+        self.uniform_length = self._uniform_length(rows)
+        (self.content_list, self.smallest_values, self.highest_values,
+         self.x_values) = wb_func.prepare_wortverbund(rows)
+
+    @staticmethod
+    def _parse(data):
+        # Unreadable rows (see "wb_check.py") are skipped, so a single bad
+        # line can't stop a view from being kept up to date.
+        rows = []
+        for row in csv.reader(data.decode('utf-8', 'replace').splitlines(), delimiter=';'):
+            if not row:
+                continue
+            try:
+                rows.append([row[0], [int(value) for value in row[1].split('/')]])
+            except (IndexError, ValueError):
+                continue
+        return rows
+
+    def refresh(self):
+        """Brings the data up to date with the file.
+
+        Returns "UNCHANGED", "APPENDED", "RELOADED" or "DELETED"."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return DELETED
+        if ((stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                == (self.stat.st_ino, self.stat.st_size, self.stat.st_mtime_ns)):
+            return UNCHANGED
+        if stat.st_ino != self.stat.st_ino or stat.st_size < self.offset:
+            self.reload()
+            return RELOADED
+        with open(self.path, 'rb') as wortverbund_file:
+            stat = os.fstat(wortverbund_file.fileno())
+            if offset_digest(wortverbund_file, self.offset) != self.digest:
+                self.reload()
+                return RELOADED
+            wortverbund_file.seek(self.offset)
+            data = wortverbund_file.read()
+            end = data.rfind(b'\n')+1
+            if end:
+                self.digest = offset_digest(wortverbund_file, self.offset+end)
+        self.stat = stat
+        if not end:
+            return UNCHANGED
+        self.offset += end
+        new_rows = self._parse(data[:end])
+        if not new_rows:
+            return UNCHANGED
+        self.merge(new_rows)
+        return APPENDED
+
+    def merge(self, new_rows):
+        """Merges new rows into the sorted "content_list" and updates the
+            extremes and x-values.
+
+        The lists are replaced by updated copies (instead of being changed in
+        place), so a view still holding the old lists keeps consistent data
+        while the merge runs in the background (see "wb_tasks.py")."""
+        content_list = list(self.content_list)
+        x_values = list(self.x_values)
+        length = self.uniform_length
+        if content_list and self._uniform_length(new_rows) != length:
+            self.uniform_length = length = None
+        elif not content_list:
+            self.uniform_length = length = self._uniform_length(new_rows)
+        if length is not None and content_list:
+            # All positions have the same number of values: the extremes can
+            # be updated from the new rows alone.
+            smallest_values = list(self.smallest_values)
+            highest_values = list(self.highest_values)
+            for row in new_rows:
+                for i in range(1, length):
+                    smallest_values[i] = min(smallest_values[i], row[1][i])
+                    highest_values[i] = max(highest_values[i], row[1][i])
+        else:
+            smallest_values = None
+        for row in new_rows:
+            # Inserted behind equal positions, as "wb_func.mergesort" (which
+            # is stable) would sort them.
+            i = bisect.bisect_right(content_list, row[1],
+                                    key=_position_key)
+            content_list.insert(i, row)
+            if smallest_values is not None:
+                x_values.insert(i, None)
+        if (smallest_values is not None
+                and smallest_values == self.smallest_values
+                and highest_values == self.highest_values):
+            # The extremes did not change, so only the x-values of the new
+            # rows have to be calculated.
+            missing = [i for i in range(len(x_values)) if x_values[i] is None]
+            new_x_values = wb_func.calculate_position_values(
+                [content_list[i] for i in missing], self.smallest_values,
+                self.highest_values)
+            for i, x_value in zip(missing, new_x_values):
+                x_values[i] = x_value
+            smallest_values, highest_values = self.smallest_values, self.highest_values
+        else:
+            smallest_values, highest_values = wb_func.find_extremes(content_list)
+            x_values = wb_func.calculate_position_values(content_list,
+                                                         smallest_values,
+                                                         highest_values)
+        (self.content_list, self.smallest_values, self.highest_values,
+         self.x_values) = content_list, smallest_values, highest_values, x_values
+
+    @staticmethod
+    def _uniform_length(content_list):
+        lengths = {len(row[1]) for row in content_list}
+        if len(lengths) == 1:
+            return lengths.pop()
+        return None
+
+
+class ProjectWatcher:
+    """Watches (some or all) wortverbund files of a project.
+
+    Args:
+        project_directory: directory of the project.
+        wortverbund_names: names of the wortverbund to watch; all wortverbund
+            (including new ones) are watched if None.
+        data: already loaded "WortverbundData" (name -> data) to start with."""
+
+    def __init__(self, project_directory, wortverbund_names=None, data=None):
+        self.project_directory = project_directory
+        self.wortverbund_names = wortverbund_names
+        self.data = dict(data or {})
+        for name in self._names():
+            if name not in self.data:
+                self.data[name] = WortverbundData(self._path(name))
+        self.inotify = None
+        if inotify_simple is not None:
+            try:
+                self.inotify = inotify_simple.INotify()
+                flags = inotify_simple.flags
+                self.inotify.add_watch(project_directory,
+                                       flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO
+                                       | flags.CREATE | flags.DELETE)
+            except OSError:
+                self.inotify = None
+
+    def _path(self, name):
+        return self.project_directory+'/'+name+'.csv'
+
+    def _names(self):
+        if self.wortverbund_names is not None:
+            return list(self.wortverbund_names)
+        return sorted(wortverbund_file[:-4] for wortverbund_file in os.listdir(self.project_directory))
+
+    def poll(self):
+        """Checks the files for changes and updates their data.
+
+        Returns a dictionary "name -> APPENDED, RELOADED or DELETED" of the
+            wortverbund that changed."""
+        if self.inotify is not None:
+            events = self.inotify.read(timeout=0)
+            if not events:
+                return {}
+            candidates = {event.name[:-4] for event in events if event.name.endswith('.csv')}
+        else:
+            candidates = None
+        changes = {}
+        names = self._names()
+        for name in names:
+            if candidates is not None and name not in candidates:
+                continue
+            if name not in self.data:
+                try:
+                    self.data[name] = WortverbundData(self._path(name))
+                except FileNotFoundError:
+                    continue
+                changes[name] = RELOADED
+                continue
+            change = self.data[name].refresh()
+            if change == DELETED:
+                del self.data[name]
+            if change != UNCHANGED:
+                changes[name] = change
+        for name in list(self.data):
+            if name not in names and name in self.data:
+                del self.data[name]
+                changes[name] = DELETED
+        return changes
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
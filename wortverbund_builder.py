@@ -17,17 +17,36 @@
 # limitations under the License.
 
 """A program providing tools to track the development of complex signs in a
-    discourse."""
+    discourse.
+
+    Started with arguments (e.g. "python -m wortverbund_builder query ...") it
+    runs the command-line interface of "wb_cli.py" instead of the GUI."""
+
+import sys
+
+if __name__ == '__main__' and len(sys.argv) > 1:
+    # Command-line use: the GUI modules are not even imported.
+    import wb_cli
+    sys.exit(wb_cli.main())
 
 import csv
 import os
 import random
-import shutil
 import tkinter as tk
 
 import matplotlib.pyplot as plt
 
+import wb_analytics # imports the analyses of the growth of wortverbund
+import wb_annotate # imports the annotation engine for annotated plots
+import wb_check # imports the validation of rows of wortverbund files
 import wb_func # imports miscellaneous calculation and sort functions needed
+import wb_lock # imports file locking for several users working on the same files
+import wb_render # imports the combined renderer for plots of all wortverbund
+import wb_tasks # imports the background task scheduler
+import wb_watch # imports the watcher keeping open views up to date
+
+WATCH_INTERVAL = 1000 # ms between two checks of the files of an open view
+REFINE_INTERVAL = 200 # minimal ms between two redraws of a plot being loaded
 
 
 class ProjectCreator(tk.Frame):
@@ -132,7 +151,7 @@ class ProjectSelecter(tk.Frame):
         if self.case == 0: # coming from "create_wortverbund"
             WortverbundCreator(ROOT, self.project_listbox.get('active')).pack()
         elif self.case == 1: # coming from "delete_project"
-            shutil.rmtree('wb_files/'+self.project_listbox.get('active'))
+            wb_lock.remove_project(self.project_listbox.get('active'))
             ROOT_FRAME.pack()
         elif self.case == 2:# coming from "delete_wortverbund"
             WortverbundSelecter(ROOT, self.project_listbox.get('active'), 2).pack()
@@ -169,7 +188,7 @@ class WortverbundCreator(tk.Frame):
             # green if the entry was accepted (and the wortverbund saved) and to
             # red if not.
             try:
-                open('wb_files/'+self.project+'/'+self.wortverbund_name_entry.get()+'.csv', 'a').close()
+                wb_lock.append(self.project, self.wortverbund_name_entry.get(), '')
                 self.wortverbund_name_entry.delete(0, 'end')
                 self.wortverbund_name_entry['bg'] = 'green'
             except OSError:
@@ -225,6 +244,21 @@ class WortverbundSelecter(tk.Frame):
                      text='There is no wortverbund in the project.').pack()
 
     def __del__(self):
+        SCHEDULER.cancel('plot_all')
+        SCHEDULER.cancel('watch_all')
+        try:
+            self.after_cancel(self.redraw_id)
+        except (AttributeError, ValueError, tk.TclError):
+            pass
+        try:
+            self.after_cancel(self.watch_id)
+            self.watcher.close()
+        except (AttributeError, tk.TclError):
+            pass
+        try:
+            self.legend_filter.destroy()
+        except (AttributeError, tk.TclError):
+            pass
         try:
             plt.close(self.figure)
         except AttributeError:
@@ -245,7 +279,8 @@ class WortverbundSelecter(tk.Frame):
     def select_wortverbund(self):
         if self.case == 2: # in order to delete a wortverbund
             try:
-                os.remove('wb_files/'+self.project+'/'+self.wortverbund_listbox.get('active')+'.csv')
+                wb_lock.remove_wortverbund(self.project,
+                                           self.wortverbund_listbox.get('active'))
                 self.wortverbund_listbox.delete('active')
             except FileNotFoundError:
                 self.__del__()
@@ -254,6 +289,7 @@ class WortverbundSelecter(tk.Frame):
             FeatureManager(ROOT, self.project,
                            self.wortverbund_listbox.get('active')).pack()
         else: # in order to show a wortverbund
+            SCHEDULER.cancel('plot_all')
             try:
                 plt.close(self.fig)
             except AttributeError:
@@ -263,63 +299,216 @@ class WortverbundSelecter(tk.Frame):
                             self.wortverbund_listbox.get('active')).pack()
 
     def plot_all(self):
-        """Plots every wortverbund of the project in a single plot."""
+        """Plots every wortverbund of the project in a single plot: a preview
+            from a sample of every wortverbund file first, which is refined
+            wortverbund by wortverbund while they are loaded in the
+            background."""
         ROOT.protocol('WM_DELETE_WINDOW', self.terminate)
-
-        content_lists = []
-        wortverbund_names = []
-        i = 0
-        # Generates "content_lists" for all of the wortverbund files in the
-        # directory of the project (every "content_list" of a wortverbund
-        # contains the features and their occurrences).
-        for wortverbund_file in os.listdir('wb_files/'+self.project):
-            with open('wb_files/'+self.project+'/'+wortverbund_file, 'r') as csv_file:
-                content_of_csv_file = csv.reader(csv_file, delimiter=';')
-                content_lists.append([])
-                wortverbund_names.append(wortverbund_file[:-4])
-                for row in content_of_csv_file:
-                    content_lists[i].append(row)
-                for j in range(len(content_lists[i])):
-                    content_lists[i][j][1] = content_lists[i][j][1].split('/')
-                    for k in range(len(content_lists[i][j][1])):
-                        content_lists[i][j][1][k] = int(content_lists[i][j][1][k])
-            i += 1
-        smallest_values = []
-        highest_values = []
-        x_values = []
-        for i in range(len(content_lists)):
-            # Sorts the "content_lists" (enables the program to work correctly
-            # even if the features of a wortverbund were not entered in the
-            # right order (i.e. the order of their occurrence)).
-            content_lists[i] = wb_func.mergesort(content_lists[i],
-                                                 len(content_lists[i]))
-            smallest_value, highest_value = wb_func.find_extremes(content_lists[i])
-            smallest_values.append(smallest_value)
-            highest_values.append(highest_value)
-            # Calculates the x-values of the "content_lists".
-            x_values.append(wb_func.calculate_position_values(content_lists[i],
-                                                              smallest_value,
-                                                              highest_value))
-
-        # Plots the "content_lists" (every wortverbund of the project).
+        self.label['text'] = 'Loading the wortverbund of the project...'
+        # Samples the wortverbund files (see "wb_tasks.sample_wortverbund")
+        # to draw a preview within a moment.
+        SCHEDULER.submit('plot_all', wb_tasks.preview_project,
+                         'wb_files/'+self.project,
+                         on_done=self.show_preview,
+                         on_error=self.show_loading_error)
+
+    def show_preview(self, previews):
+        self.plot_series = {wortverbund_name: wb_render.Series(wortverbund_name, *sample)
+                            for wortverbund_name, sample in previews}
+        self.preview_names = set(self.plot_series)
         self.figure = plt.figure(0)
         self.figure.canvas.set_window_title('Plot of all wortverbund in \"'+self.project[:-5]+'\"')
+        self.figure.canvas.mpl_connect('close_event', self.close_plot_all)
+        self.draw_plot_all()
+        self.legend_filter = LegendFilter(self, sorted(self.plot_series))
+        self.cancel_button = tk.Button(self, font='Arial 16', text='Cancel',
+                                       width=7, command=self.cancel_loading)
+        self.cancel_button.pack()
+        # Generates "content_lists" for all of the wortverbund files in the
+        # directory of the project (every "content_list" of a wortverbund
+        # contains the features and their occurrences) and sorts and encodes
+        # them (see "wb_tasks.load_project").
+        SCHEDULER.submit('plot_all', wb_tasks.load_project,
+                         'wb_files/'+self.project,
+                         on_done=self.show_plot_all,
+                         on_progress=self.refine_plot_all,
+                         on_error=self.show_loading_error)
+        # Doesn't block: the plot is refined by the mainloop while it is
+        # open.
+        plt.show(block=False)
+
+    def close_plot_all(self, event=None):
+        """Closing the plot cancels the loading and closes the legend
+            filter."""
+        self.cancel_loading()
+        try:
+            self.legend_filter.destroy()
+        except (AttributeError, tk.TclError):
+            pass
+
+    def refine_plot_all(self, done, total, wortverbund_name, data):
+        """Replaces the preview of a wortverbund by its loaded data."""
+        if not plt.fignum_exists(self.figure.number):
+            self.close_plot_all()
+            return
+        self.label['text'] = 'Loading the wortverbund of the project ('+str(done)+'/'+str(total)+')...'
+        self.plot_series[wortverbund_name] = self.make_series(wortverbund_name, data)
+        self.preview_names.discard(wortverbund_name)
+        # Redraws at most every "REFINE_INTERVAL" ms however fast the
+        # wortverbund arrive.
+        if getattr(self, 'redraw_id', None) is None:
+            self.redraw_id = self.after(REFINE_INTERVAL, self.redraw_plot_all)
+
+    def cancel_loading(self):
+        """Stops loading; the plot keeps showing what was loaded so far."""
+        SCHEDULER.cancel('plot_all')
+        self.label['text'] = 'Select a wortverbund: '
+        try:
+            self.cancel_button.destroy()
+        except AttributeError:
+            pass
+
+    def show_loading_error(self, error):
+        self.label['text'] = 'Sorry, the project couldn\'t be plotted!'
+
+    def show_plot_all(self, loaded_wortverbund):
+        self.label['text'] = 'Select a wortverbund: '
+        self.cancel_button.destroy()
+        if not plt.fignum_exists(self.figure.number):
+            self.close_plot_all()
+            return
+        # Keeps the plot up to date with the files of the project (see
+        # "self.watch").
+        self.watcher = wb_watch.ProjectWatcher('wb_files/'+self.project,
+                                               data=dict(loaded_wortverbund))
+        self.update_series()
+        self.redraw_plot_all()
+        self.watch_id = self.after(WATCH_INTERVAL, self.watch)
+
+    def highlight(self, wortverbund_names):
+        self.renderer.highlight(wortverbund_names)
+
+    @staticmethod
+    def make_series(wortverbund_name, data):
+        """Returns the "wb_render.Series" of a loaded wortverbund (see
+            "wb_watch.WortverbundData")."""
+        indices = [j for j in range(len(data.x_values)) if data.x_values[j] > 0]
+        return wb_render.Series(wortverbund_name,
+                                [data.x_values[j] for j in indices],
+                                [j+1 for j in indices],
+                                [data.content_list[j][0] for j in indices],
+                                [wb_func.format_position(data.content_list[j][1]) for j in indices])
+
+    def update_series(self):
+        self.plot_series = {wortverbund_name: self.make_series(wortverbund_name, data)
+                            for wortverbund_name, data in self.watcher.data.items()}
+        self.preview_names = set()
+
+    def redraw_plot_all(self):
+        self.redraw_id = None
+        if not plt.fignum_exists(self.figure.number):
+            return
+        self.renderer.disconnect()
+        self.figure.clf()
+        self.draw_plot_all()
+        self.figure.canvas.draw_idle()
+
+    def draw_plot_all(self):
+        """Plots the "content_lists" (every wortverbund of the project) with a
+            single line and a single scatter artist (see "wb_render.py");
+            wortverbund that are not loaded yet are drawn from their
+            samples."""
+        series = [self.plot_series[wortverbund_name] for wortverbund_name in sorted(self.plot_series)]
+        if self.preview_names:
+            plt.title('Preview ('+str(len(self.preview_names))+' wortverbund still loading)',
+                      fontsize=10)
         plt.xlabel('Position of addition of a feature ('+self.project[-4:]+' of occurrence)')
         plt.ylabel('Number of features')
-        for i in range(len(content_lists)):
-            features = [None]*(len(x_values[i])+1)
-            positions = [None]*(len(x_values[i])+1)
-            indices = [None]*(len(x_values[i])+1)
-            for j in range(len(x_values[i])):
-                if x_values[i][j] > 0:
-                    positions[j+1] = x_values[i][j]
-                    features[j+1] = content_lists[i][j][0]
-                    indices[j+1] = j+1
-            plt.plot(positions, indices, label=wortverbund_names[i])
-            plt.plot(positions, indices, '.')
-        plt.legend(loc='upper left')
+        self.renderer = wb_render.CombinedRenderer(plt.gca(), series)
+        self.renderer.legend(loc='upper left')
+        try:
+            self.legend_filter.set_names([s.name for s in series])
+            self.renderer.highlight(self.legend_filter.selection())
+        except (AttributeError, tk.TclError):
+            pass
         plt.grid(alpha=0.4)
-        plt.show()
+
+    def watch(self):
+        """Redraws the plot in place if a wortverbund file of the project
+            changed (as long as the plot is open)."""
+        if not plt.fignum_exists(self.figure.number):
+            self.watcher.close()
+            try:
+                self.legend_filter.destroy()
+            except tk.TclError:
+                pass
+            return
+        SCHEDULER.submit('watch_all', wb_tasks.poll_project, self.watcher,
+                         on_done=self.apply_changes,
+                         on_error=self.watch_later)
+
+    def watch_later(self, error=None):
+        # Files that can't be read right now are checked again later.
+        self.watch_id = self.after(WATCH_INTERVAL, self.watch)
+
+    def apply_changes(self, changes):
+        if changes and plt.fignum_exists(self.figure.number):
+            self.update_series()
+            self.redraw_plot_all()
+        self.watch_later()
+
+
+class LegendFilter(tk.Toplevel):
+    """Window listing the wortverbund of a plot of all wortverbund; the list
+        can be searched and the selected wortverbund are highlighted in the
+        plot (the others are faded out)."""
+
+    def __init__(self, selecter, wortverbund_names):
+        tk.Toplevel.__init__(self)
+        self.title('Wortverbund in the plot')
+        self.selecter = selecter
+        tk.Label(self, font='Arial 11', text='Search: ').pack()
+        self.search_entry = tk.Entry(self, font='Arial 14', width=26)
+        self.search_entry.pack()
+        self.search_entry.bind('<KeyRelease>', self.filter)
+        self.wortverbund_listbox = tk.Listbox(self, font='Arial 14', height=18,
+                                              width=26, selectmode='extended',
+                                              exportselection=False)
+        self.wortverbund_listbox.pack()
+        self.wortverbund_listbox.bind('<<ListboxSelect>>', self.select)
+        tk.Button(self, font='Arial 14', text='Show all', width=12,
+                  command=self.show_all).pack()
+        self.selected = set()
+        self.set_names(wortverbund_names)
+
+    def set_names(self, wortverbund_names):
+        self.wortverbund_names = list(wortverbund_names)
+        self.selected &= set(self.wortverbund_names)
+        self.filter()
+
+    def selection(self):
+        return set(self.selected)
+
+    def filter(self, event=None):
+        """Lists only the wortverbund containing the search text."""
+        search_text = self.search_entry.get().lower()
+        self.wortverbund_listbox.delete(0, 'end')
+        for wortverbund_name in self.wortverbund_names:
+            if search_text in wortverbund_name.lower():
+                self.wortverbund_listbox.insert('end', wortverbund_name)
+                if wortverbund_name in self.selected:
+                    self.wortverbund_listbox.selection_set('end')
+
+    def select(self, event=None):
+        listed = set(self.wortverbund_listbox.get(0, 'end'))
+        self.selected -= listed
+        self.selected |= {self.wortverbund_listbox.get(i) for i in self.wortverbund_listbox.curselection()}
+        self.selecter.highlight(self.selected)
+
+    def show_all(self):
+        self.selected = set()
+        self.wortverbund_listbox.selection_clear(0, 'end')
+        self.selecter.highlight(self.selected)
 
 
 class FeatureManager(tk.Frame):
@@ -333,13 +522,9 @@ class FeatureManager(tk.Frame):
         self.feature_listbox = tk.Listbox(self, font='Arial 16', height=16,
                                           width=36)
         self.feature_listbox.pack()
-        try:
-            with open('wb_files/'+project+'/'+wortverbund+'.csv', 'r') as csv_file:
-                content_of_csv_file = csv.reader(csv_file, delimiter=';')
-                for row in content_of_csv_file:
-                    self.feature_listbox.insert('end', '\"'+row[0]+'\"'+'| at '+row[1])
-        except IOError:
-            pass
+        self.project = project
+        self.wortverbund = wortverbund
+        self.load_features()
         remove_button = tk.Button(self, font='Arial 16 italic', text='Remove',
                                   width=12, command=self.remove)
         remove_button.configure(fg='red')
@@ -365,8 +550,6 @@ class FeatureManager(tk.Frame):
                                width=12, command=self.add)
         add_button.configure(fg='green')
         add_button.pack()
-        self.project = project
-        self.wortverbund = wortverbund
 
     def __del__(self):
         try:
@@ -375,39 +558,55 @@ class FeatureManager(tk.Frame):
         except tk.TclError:
             pass
 
+    def load_features(self):
+        """Fills "self.feature_listbox" with the features saved in the
+            wortverbund file and remembers the version of the file that was
+            read (see "wb_lock.version")."""
+        self.feature_listbox.delete(0, 'end')
+        self.version = wb_lock.version('wb_files/'+self.project+'/'+self.wortverbund+'.csv')
+        try:
+            with open('wb_files/'+self.project+'/'+self.wortverbund+'.csv', 'r') as csv_file:
+                content_of_csv_file = csv.reader(csv_file, delimiter=';')
+                for row in content_of_csv_file:
+                    self.feature_listbox.insert('end', '\"'+row[0]+'\"'+'| at '+row[1])
+        except IOError:
+            pass
+
     def add(self):
         if self.feature_name_entry.get() and self.feature_position_entry.get():
             try:
-                if '/' in self.feature_position_entry.get():
-                    int_check_list = self.feature_position_entry.get().split('/')
-                    for i in range(len(int_check_list)):
-                        if int_check_list[i] and not self.check_if_integer(int_check_list[i]):
-                            raise ValueError
-                else:
-                    if not self.check_if_integer(self.feature_position_entry.get()):
-                        raise ValueError
-                with open('wb_files/'+self.project+'/'+self.wortverbund+'.csv', 'a') as wortverbund_file:
-                    wortverbund_file.write(self.feature_name_entry.get()+';'+self.feature_position_entry.get()+'\n')
+                # Accepts only integers separated by "/" (without empty parts
+                # like in "12/", see "wb_check.valid_position").
+                if not wb_check.valid_position(self.feature_position_entry.get()):
+                    raise ValueError
+                if ';' in self.feature_name_entry.get():
+                    self.explanation_label['text'] = 'A feature must not contain \";\"!'
+                    self.explanation_label['fg'] = 'red'
+                    return
+                # Appends while holding the lock of the wortverbund; the
+                # version of the file is only brought up to date if nobody
+                # else changed the file since it was read.
+                old_version, new_version = wb_lock.append(self.project, self.wortverbund,
+                                                          self.feature_name_entry.get()+';'+self.feature_position_entry.get()+'\n')
+                if old_version == self.version:
+                    self.version = new_version
                 self.feature_listbox.insert('end', '\"'+self.feature_name_entry.get()+'\"| at '+self.feature_position_entry.get())
                 self.feature_name_entry.delete(0, 'end')
                 self.feature_position_entry.delete(0, 'end')
             # Raises an exception if the string entered in
-            # "self.feature_name_entry" (and perhaps split by "/") is not an
-            # integer.
+            # "self.feature_position_entry" is not made of integers separated
+            # by "/".
             except ValueError:
                 self.explanation_label['text'] = 'You have to enter a number (an integer)! Letters are not accepted. Use \"/\" for separations.'
                 self.explanation_label['fg'] = 'red'
 
-    def check_if_integer(self, value_entered):
-        try:
-            int(value_entered)
-            return True
-        except ValueError:
-            return False
-
     def remove(self):
         """Removes a selected feature from wortverbund by rebuilding the file's
-            (i.e. the wortverbund's) content."""
+            (i.e. the wortverbund's) content.
+
+            The file is replaced atomically and only if nobody else changed it
+            since it was read; otherwise the list of features is reloaded and
+            nothing is removed."""
         try:
             with open('wb_files/'+self.project+'/'+self.wortverbund+'.csv',
                       'r') as csv_file_to_read:
@@ -421,24 +620,28 @@ class FeatureManager(tk.Frame):
                 for row in content_of_csv_file_to_read:
                     feature_string_list.append(row[0]+';'+row[1]+'\n')
                     if self.feature_listbox.get('active').split('|')[0][1:-1] == row[0] and not feature_to_remove_found:
-                        self.feature_listbox.delete('active')
                         feature_to_remove_found = True
                     # Counts up until "feature_to_remove_found" is True to get
                     # the index ("i") of the line that shall be removed.
                     if not feature_to_remove_found:
                         i += 1
-            with open('wb_files/'+self.project+'/'+self.wortverbund+'.csv',
-                      'w') as csv_file_to_write:
-                j = 0
-                feature_string = ''
-                # Rebuilds a string ("feature_string") out of the elements of
-                # the "feature_string_list", but skips the line with index "i",
-                # so the feature that should be removed finally is removed.
-                for k in range(len(feature_string_list)):
-                    if i != j:
-                        feature_string += feature_string_list[k]
-                    j += 1
-                csv_file_to_write.write(feature_string)
+            j = 0
+            feature_string = ''
+            # Rebuilds a string ("feature_string") out of the elements of the
+            # "feature_string_list", but skips the line with index "i", so the
+            # feature that should be removed finally is removed.
+            for k in range(len(feature_string_list)):
+                if i != j:
+                    feature_string += feature_string_list[k]
+                j += 1
+            self.version = wb_lock.rewrite(self.project, self.wortverbund,
+                                           feature_string, self.version)
+            if feature_to_remove_found:
+                self.feature_listbox.delete('active')
+        except wb_lock.ConflictError:
+            self.load_features()
+            self.explanation_label['text'] = 'The wortverbund was changed by someone else in the meantime. Please select the feature to remove again.'
+            self.explanation_label['fg'] = 'red'
         except IOError:
             pass
 
@@ -459,24 +662,29 @@ class WortverbundShow(tk.Frame):
         self.project = project
         self.wortverbund = wortverbund
 
-        with open('wb_files/'+self.project+'/'+self.wortverbund+'.csv', 'r') as csv_file:
-            content_of_csv_file = csv.reader(csv_file, delimiter=';')
-            content_list = []
-            for row in content_of_csv_file:
-                content_list.append(row)
-            for i in range(len(content_list)):
-                content_list[i][1] = content_list[i][1].split('/')
-                for j in range(len(content_list[i][1])):
-                    content_list[i][1][j] = int(content_list[i][1][j])
-        if not content_list:
+        # Reads, sorts and encodes the wortverbund in the background (see
+        # "self.build_widgets").
+        self.loading_label = tk.Label(self, font='Arial 16',
+                                      text='Loading \"'+self.wortverbund+'\"...')
+        self.loading_label.pack()
+        self.load_task = SCHEDULER.submit('show', wb_tasks.load_wortverbund,
+                                          'wb_files/'+self.project+'/'+self.wortverbund+'.csv',
+                                          on_done=self.build_widgets,
+                                          on_error=self.show_loading_error)
+
+    def show_loading_error(self, error):
+        self.loading_label['text'] = 'Sorry, \"'+self.wortverbund+'\" couldn\'t be loaded!'
+
+    def build_widgets(self, data):
+        self.loading_label.forget()
+        if not data.content_list:
             tk.Label(self, font='Arial 16', text='There are no features saved for \"'+self.wortverbund+'\"!').pack()
         else:
-            self.content_list = wb_func.mergesort(content_list,
-                                                  len(content_list)) # sorts the "content_list"
-            self.smallest_values, self.highest_values = wb_func.find_extremes(self.content_list)
-            self.x_values = wb_func.calculate_position_values(self.content_list,
-                                                      self.smallest_values,
-                                                      self.highest_values)
+            self.data = data
+            self.content_list = data.content_list
+            self.smallest_values = data.smallest_values
+            self.highest_values = data.highest_values
+            self.x_values = data.x_values
 
             tk.Label(self, font='Arial 16 bold', text='\nSelect a start and an end as limits: ').pack()
             self.scale_0 = tk.Scale(self, font='Arial 14', from_=0,
@@ -526,10 +734,60 @@ class WortverbundShow(tk.Frame):
                       text='Plot annotated (precise)', width=19,
                       command=self.show_plot_annotated_entries).pack(side='left')
             precise_button_frame.pack()
+            self.show_analytics = tk.IntVar()
+            tk.Checkbutton(self, font='Arial 14',
+                           text='Show the feature density and its change points in plots',
+                           variable=self.show_analytics).pack()
 
             ROOT.protocol('WM_DELETE_WINDOW', self.terminate)
+            self.watch_id = self.after(WATCH_INTERVAL, self.watch)
+
+    def watch(self):
+        """Merges features appended to the wortverbund file (e.g. by a
+            colleague) into the data in the background (see "self.apply_change")."""
+        SCHEDULER.submit('watch', wb_tasks.refresh_wortverbund, self.data,
+                         on_done=self.apply_change,
+                         on_error=self.watch_later)
+
+    def watch_later(self, error=None):
+        # A file that can't be read right now is checked again later.
+        self.watch_id = self.after(WATCH_INTERVAL, self.watch)
+
+    def apply_change(self, change):
+        """Updates the sliders and an open list or plot in place."""
+        if change == wb_watch.DELETED:
+            return
+        if change != wb_watch.UNCHANGED and self.data.content_list:
+            at_end = self.scale_1.get() >= self.x_values[-1]+1
+            self.content_list = self.data.content_list
+            self.smallest_values = self.data.smallest_values
+            self.highest_values = self.data.highest_values
+            self.x_values = self.data.x_values
+            self.scale_0['to'] = self.x_values[-1]+1
+            self.scale_1['to'] = self.x_values[-1]+1
+            if at_end:
+                self.scale_1.set(self.x_values[-1]+1)
+            try:
+                if self.feature_list_show.winfo_exists() and len(self.shown_range) == 2:
+                    self.show_list(*self.shown_range, refresh=True)
+            except (AttributeError, tk.TclError):
+                try:
+                    if len(self.shown_range) == 3 and plt.fignum_exists(self.figure.number):
+                        self.disconnect_annotations()
+                        self.figure.clf()
+                        self.draw_plot(*self.shown_range)
+                        self.figure.canvas.draw_idle()
+                except AttributeError:
+                    pass
+        self.watch_later()
 
     def __del__(self):
+        self.load_task.cancel()
+        SCHEDULER.cancel('watch')
+        try:
+            self.after_cancel(self.watch_id)
+        except (AttributeError, tk.TclError):
+            pass
         try:
             self.feature_list_show.destroy()
         except (AttributeError, tk.TclError):
@@ -622,20 +880,27 @@ class WortverbundShow(tk.Frame):
         else: # coming from "self.show_plot_annotated_entries"
             self.show_plot(x_values[0], x_values[1], 2)
 
-    def show_list(self, start, end):
+    def show_list(self, start, end, refresh=False):
+        """Shows the features within the range in a new window (or, if
+            "refresh" is True, in the window that is already open)."""
         if start > end:
             temp = start
             start = end
             end = temp
-        try:
-            self.feature_list_show.destroy()
-        except (AttributeError, tk.TclError):
+        self.shown_range = (start, end)
+        if refresh:
+            for widget in self.feature_list_show.winfo_children():
+                widget.destroy()
+        else:
             try:
-                plt.close(self.figure)
-            except AttributeError:
-                pass
-        self.feature_list_show = tk.Tk()
-        self.feature_list_show.title('\"'+self.wortverbund+'\" in range from '+str(start)+' to '+str(end))
+                self.feature_list_show.destroy()
+            except (AttributeError, tk.TclError):
+                try:
+                    plt.close(self.figure)
+                except AttributeError:
+                    pass
+            self.feature_list_show = tk.Tk()
+            self.feature_list_show.title('\"'+self.wortverbund+'\" in range from '+str(start)+' to '+str(end))
         content_list_string = ''
         for i in range(len(self.x_values)):
             if self.x_values[i] >= start and self.x_values[i] <= end:
@@ -666,8 +931,23 @@ class WortverbundShow(tk.Frame):
                 plt.close(self.figure)
             except AttributeError:
                 pass
+        self.shown_range = (start, end, case)
         self.figure = plt.figure(0)
         self.figure.canvas.set_window_title('\"'+self.wortverbund+'\" in range from '+str(start)+' to '+str(end))
+        self.draw_plot(start, end, case)
+        plt.show()
+
+    def disconnect_annotations(self):
+        # The culler of the previous plot must not react to resizes of the
+        # canvas any longer (its labels are gone with "clf").
+        try:
+            self.annotation_culler.disconnect()
+        except AttributeError:
+            pass
+        self.annotation_culler = None
+
+    def draw_plot(self, start, end, case):
+        self.disconnect_annotations()
         plt.xlabel('Position of addition of a feature ('+self.project[-4:]+' of occurrence)')
         plt.ylabel('Number of features')
 
@@ -683,14 +963,21 @@ class WortverbundShow(tk.Frame):
         plt.plot(positions, indices, 'xr')
 
         if case == 2: # coming from "self.show_plot_annotated_sliders" or "self.show_plot_annotated_entries"
-            # Annotates the plot by showing the features.
-            for i in range(len(features)):
-                if features[i]:
-                    plt.annotate(features[i], (positions[i], indices[i]),
-                                 xytext=(-22, 17), textcoords='offset points',
-                                 arrowprops=dict(arrowstyle='-'))
+            # Annotates the plot by showing the features (only as many as
+            # fit without overlapping at the current zoom level).
+            annotated = [i for i in range(len(features)) if features[i]]
+            self.annotation_culler = wb_annotate.AnnotationCuller(plt.gca(),
+                                                                  [positions[i] for i in annotated],
+                                                                  [indices[i] for i in annotated],
+                                                                  [features[i] for i in annotated])
         plt.grid(alpha=0.4)
-        plt.show()
+        if self.show_analytics.get():
+            # Draws the density of the features and the positions where it
+            # changes on a second y-axis (see "wb_analytics.py").
+            shown = [position for position in positions if position is not None]
+            if len(shown) > 1:
+                wb_analytics.overlay(plt.gca(), wb_analytics.analyse(shown, start=min(shown),
+                                                                     end=max(shown)))
 
     def show_error(self, start, end):
         """Shows an error message to the user if the selected start position and
@@ -702,6 +989,7 @@ class WortverbundShow(tk.Frame):
                 plt.close(self.figure)
             except AttributeError:
                 pass
+        self.shown_range = ()
         self.feature_list_show = tk.Tk()
         self.feature_list_show.title('')
         tk.Label(self.feature_list_show, font='Arial 16',
@@ -740,22 +1028,24 @@ def show_wortverbund():
     ProjectSelecter(ROOT, 4).pack()
 
 
-ROOT = tk.Tk()
-ROOT.title('wortverbund_builder')
-
-ROOT_FRAME = tk.Frame(ROOT)
-tk.Button(ROOT_FRAME, font='Arial 16', text='New project', width=28,
-          command=create_project).pack()
-tk.Button(ROOT_FRAME, font='Arial 16', text='New wortverbund', width=28,
-          command=create_wortverbund).pack()
-tk.Button(ROOT_FRAME, font='Arial 16', text='Delete project', width=28,
-          command=delete_project).pack()
-tk.Button(ROOT_FRAME, font='Arial 16', text='Delete wortverbund', width=28,
-          command=delete_wortverbund).pack()
-tk.Button(ROOT_FRAME, font='Arial 16', text='Work on features of a wortverbund',
-          width=28, command=work_on_features).pack()
-tk.Button(ROOT_FRAME, font='Arial 16', text='Show wortverbund', width=28,
-          command=show_wortverbund).pack()
-ROOT_FRAME.pack()
-
-ROOT.mainloop()
+if __name__ == '__main__':
+    ROOT = tk.Tk()
+    ROOT.title('wortverbund_builder')
+    SCHEDULER = wb_tasks.TaskScheduler(ROOT)
+
+    ROOT_FRAME = tk.Frame(ROOT)
+    tk.Button(ROOT_FRAME, font='Arial 16', text='New project', width=28,
+              command=create_project).pack()
+    tk.Button(ROOT_FRAME, font='Arial 16', text='New wortverbund', width=28,
+              command=create_wortverbund).pack()
+    tk.Button(ROOT_FRAME, font='Arial 16', text='Delete project', width=28,
+              command=delete_project).pack()
+    tk.Button(ROOT_FRAME, font='Arial 16', text='Delete wortverbund', width=28,
+              command=delete_wortverbund).pack()
+    tk.Button(ROOT_FRAME, font='Arial 16', text='Work on features of a wortverbund',
+              width=28, command=work_on_features).pack()
+    tk.Button(ROOT_FRAME, font='Arial 16', text='Show wortverbund', width=28,
+              command=show_wortverbund).pack()
+    ROOT_FRAME.pack()
+
+    ROOT.mainloop()